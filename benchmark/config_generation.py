@@ -0,0 +1,170 @@
+""" Benchmark for config generation and reconfiguration with synthetic fleets
+
+Generates N workers with random platform and setup tags, M projects and a
+.buildbot.yml with K profiles and A actions per project. Reports the time and
+the resident memory retained by loading, builder generation, trigger selection
+and reconfiguration of a stubbed master, then the peak memory of the run.
+Registering again with the same snapshots shows the early return, new snapshots
+of every project show a second generation. Needs buildbot, but no running master.
+Run with: python benchmark/config_generation.py [workers] [projects] [profiles] [actions] [seed]
+"""
+from __future__ import print_function
+import os
+import random
+import shutil
+import sys
+import tempfile
+from os import path
+from timeit import default_timer
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..'))
+import yaml
+from twisted.internet import defer
+from buildbot_inplace.config import Wrapper
+from buildbot_inplace.delta import ConfigDelta
+from buildbot_inplace.inplace_config import InplaceConfig, blob_id
+from buildbot_inplace.steps.reconfig_buildmaster import create_master_config
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows
+
+PLATFORMS = ['Platform%d' % index for index in range(20)]
+SETUPS = ['setup%d' % index for index in range(30)]
+COMMAND_KEYS = ['std', 'msvc']
+
+
+def generate_worker(rand, index):
+    return dict(name='worker%d' % index,
+                password='secret%d' % index,
+                shell='bash',
+                setupDir='~/scripts',
+                platforms=rand.sample(PLATFORMS, 3),
+                setups=rand.sample(SETUPS, 8))
+
+
+def generate_project(index):
+    return dict(name='Project%d' % index,
+                repoType='git',
+                repoUrl='https://example.com/project%d.git' % index,
+                repoUser='',
+                repoPassword='')
+
+
+def generate_inplace(rand, profiles, actions):
+    return yaml.safe_dump(dict(
+        profiles=[dict(name='Profile %d' % index,
+                       platform=rand.choice(PLATFORMS),
+                       commands=rand.choice(COMMAND_KEYS),
+                       setup=rand.sample(SETUPS, rand.randint(1, 2)))
+                  for index in range(profiles)],
+        actions=[dict([('name', 'Action %d' % index)] +
+                      [(key, '%s step %d' % (key, index)) for key in COMMAND_KEYS])
+                 for index in range(actions)]))
+
+
+def write_yaml(directory, entries):
+    os.makedirs(directory)
+    for index, entry in enumerate(entries):
+        with open(path.join(directory, "%05d.yml" % index), 'w') as f:
+            yaml.safe_dump(entry, f)
+
+
+def peak_memory_mb():
+    """ Peak resident memory of the whole run """
+    if resource is None:
+        return float('nan')
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # kilobytes on Linux
+
+
+def resident_memory_mb():
+    """ Current resident memory, only available on Linux """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024.0 * 1024.0)
+    except (IOError, OSError, ValueError):
+        return float('nan')
+
+
+def measure(name, function):
+    """ Prints the time of function and the resident memory it added """
+    resident = resident_memory_mb()
+    start = default_timer()
+    result = function()
+    elapsed = default_timer() - start
+    print("  %-36s %8.3f s   retained %+8.1f MB" % (name, elapsed, resident_memory_mb() - resident))
+    return result
+
+
+class StubWorkers(object):
+    services = []
+
+
+class StubMaster(object):
+    """ Just enough of a master for the reconfig queue """
+
+    def __init__(self, config):
+        self.config = config
+        self.workers = StubWorkers()
+
+    def reconfigServiceWithBuildbotConfig(self, config):
+        return defer.succeed(None)
+
+
+def register_projects(c):
+    delta = ConfigDelta()
+    for project in c.projects:
+        delta.update(c.setup_project_inplace(project))
+    return delta
+
+
+def trigger_names(c):
+    return sum(len(c.project_trigger_names(project, c.snapshots.latest(project.name))) for project in c.projects)
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    projects = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    profiles = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    actions = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+    rand = random.Random(int(sys.argv[5]) if len(sys.argv) > 5 else 42)
+    base = tempfile.mkdtemp()
+    try:
+        workers_dir = path.join(base, 'workers')
+        projects_dir = path.join(base, 'projects')
+        write_yaml(workers_dir, [generate_worker(rand, index) for index in range(workers)])
+        write_yaml(projects_dir, [generate_project(index) for index in range(projects)])
+        inplace_texts = [generate_inplace(rand, profiles, actions) for _ in range(projects)]
+
+        print("%d workers, %d projects, %d profiles x %d actions" % (workers, projects, profiles, actions))
+        c = Wrapper()
+        c['protocols'] = {'pb': {'port': 9989}}
+        measure("Worker.load", lambda: c.load_workers(workers_dir))
+        measure("Project.load", lambda: c.load_projects(projects_dir))
+        inplace_configs = measure(".buildbot.yml parsing", lambda: [InplaceConfig.from_text(text)
+                                                                     for text in inplace_texts])
+        for project, text, inplace in zip(c.projects, inplace_texts, inplace_configs):
+            c.snapshots.acquire(project.name, blob_id(text), inplace)
+        measure("setup_inplace", c.setup_inplace)
+        master_config = measure("create_master_config", lambda: create_master_config(c))
+        c.master_config = master_config
+        delta = measure("setup_project_inplace", lambda: register_projects(c))
+        print("  %d builders registered" % len(delta.builders))
+        measure("project_trigger_names", lambda: trigger_names(c))
+        master = StubMaster(master_config)
+        measure("reconfigure stub master", lambda: c.reconfig_queue._apply(master, delta))
+        measure("setup_project_inplace unchanged", lambda: register_projects(c))
+        for project in c.projects:
+            text = generate_inplace(rand, profiles, actions)
+            c.snapshots.acquire(project.name, blob_id(text), InplaceConfig.from_text(text))
+        delta = measure("setup_project_inplace new snapshots", lambda: register_projects(c))
+        print("  %d builders registered" % len(delta.builders))
+        print("  peak memory %.1f MB" % peak_memory_mb())
+    finally:
+        shutil.rmtree(base)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+""" Memory benchmark for the slotted worker and inplace config model
+
+Builds a fleet of workers and inplace configs with the slotted classes and
+with the former dict subclasses, and compares their deep size (shared and
+interned objects are counted once) and the time to walk their tags.
+Run with: python benchmark/model_memory.py [workers] [configs] [profiles] [actions]
+"""
+from __future__ import print_function
+import sys
+from os import path
+from timeit import default_timer
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..', 'buildbot_inplace'))
+from buildbot.util import flatten
+from inplace_config import InplaceConfig
+from worker import Worker
+
+
+class DictWorker(dict):
+    @property
+    def platforms(self):
+        return self['platforms']
+
+    @property
+    def setups(self):
+        return self['setups']
+
+
+class DictProfile(dict):
+    @property
+    def setups(self):
+        return flatten([self.get('setups', self.get('setup', []))])
+
+
+class DictAction(dict):
+    RESERVED_KEYS = ['name', 'needs', 'paths', 'excludePaths']
+
+    @property
+    def command_keys(self):
+        return [key for key in self.keys() if key not in self.RESERVED_KEYS]
+
+
+def worker_data(index):
+    # built from fresh strings like the YAML parser does
+    return dict(name='worker%d' % index, password='secret%d' % index, shell='bash', setupDir='~/scripts',
+                platforms=['Linux', 'Ubuntu', 'Ubuntu-14.04', 'Platform%d' % (index % 17)],
+                setups=['qt530_gcc490', 'qt551_gcc520', 'setup%d' % (index % 23)])
+
+
+def inplace_data(profiles, actions):
+    return dict(profiles=[dict(name='Profile %d' % index, platform='Platform%d' % (index % 17), commands='std',
+                               setup=['qt551_gcc520', 'setup%d' % (index % 23)])
+                          for index in range(profiles)],
+                actions=[dict(name='Action %d' % index, std='make step%d' % index, msvc='nmake step%d' % index)
+                         for index in range(actions)])
+
+
+def deep_size(obj, seen):
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    if hasattr(obj, '__dict__'):
+        size += deep_size(obj.__dict__, seen)
+    for name in getattr(type(obj), '__slots__', ()):
+        if hasattr(obj, name):
+            size += deep_size(getattr(obj, name), seen)
+    return size
+
+
+def timed(function):
+    start = default_timer()
+    function()
+    return default_timer() - start
+
+
+def walk(workers, configs):
+    for worker in workers:
+        len(worker.platforms) + len(worker.setups)
+    for profiles, actions in configs:
+        for profile in profiles:
+            len(profile.setups)
+        for action in actions:
+            len(action.command_keys)
+
+
+def main():
+    worker_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    config_count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    profile_count = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    action_count = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+
+    dict_workers = [DictWorker(**worker_data(index)) for index in range(worker_count)]
+    dict_configs = []
+    for _ in range(config_count):
+        data = inplace_data(profile_count, action_count)
+        dict_configs.append(([DictProfile(**profile) for profile in data['profiles']],
+                             [DictAction(**action) for action in data['actions']]))
+
+    slotted_workers = [Worker(**worker_data(index)) for index in range(worker_count)]
+    slotted_configs = []
+    for _ in range(config_count):
+        inplace = InplaceConfig(**inplace_data(profile_count, action_count))
+        slotted_configs.append((inplace.profiles, inplace.actions))
+
+    print("%d workers, %d configs with %d profiles x %d actions" %
+          (worker_count, config_count, profile_count, action_count))
+    for name, workers, configs in [("dict", dict_workers, dict_configs),
+                                   ("slotted", slotted_workers, slotted_configs)]:
+        seen = set()
+        print("  %-8s workers %8.1f MB   configs %8.1f MB   walk %8.3f s" %
+              (name, deep_size(workers, seen) / 1048576.0, deep_size(configs, seen) / 1048576.0,
+               timed(lambda: walk(workers, configs))))
+
+
+if __name__ == '__main__':
+    main()
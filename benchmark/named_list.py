@@ -0,0 +1,62 @@
+""" Micro-benchmark for NamedList
+
+Compares the indexed NamedList against the former linear scan implementation.
+Run with: python benchmark/named_list.py
+"""
+from __future__ import print_function
+import sys
+from os import path
+from timeit import default_timer
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..', 'buildbot_inplace'))
+from named_list import NamedList
+
+
+class LinearNamedList(list):
+    def named_set(self, elem):
+        self.named_del(elem.name)
+        self.append(elem)
+
+    def named_del(self, name):
+        for elem in self:
+            if elem.name == name:
+                self.remove(elem)
+
+    def named_get(self, name):
+        for elem in self:
+            if elem.name == name:
+                return elem
+
+
+class Named(object):
+    __slots__ = ['name']
+
+    def __init__(self, name):
+        self.name = name
+
+
+def run(list_class, count):
+    elems = [Named("builder_%d" % i) for i in range(count)]
+    named = list_class()
+    start = default_timer()
+    for elem in elems:
+        named.named_set(elem)
+    for elem in elems:
+        named.named_set(elem)  # replace
+    for elem in elems:
+        named.named_get(elem.name)
+    for elem in elems[::10]:
+        named.named_del(elem.name)
+    return default_timer() - start
+
+
+def main():
+    print("%8s %12s %12s" % ("entries", "indexed [s]", "linear [s]"))
+    for count in [100, 1000, 10000]:
+        indexed = run(NamedList, count)
+        linear = run(LinearNamedList, count) if count <= 1000 or '--full' in sys.argv else float('nan')
+        print("%8d %12.4f %12.4f" % (count, indexed, linear))
+
+
+if __name__ == '__main__':
+    main()
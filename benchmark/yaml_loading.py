@@ -0,0 +1,77 @@
+""" Benchmark for loading worker and project directories
+
+Generates worker and project YAML files and measures a cold load with the
+pure-Python parser, a cold load with the libyaml parser (if available),
+a warm load from the (path, mtime, size) cache and a load after one change.
+Run with: python benchmark/yaml_loading.py [count] [processes]
+"""
+from __future__ import print_function
+import os
+import shutil
+import sys
+import tempfile
+from glob import glob
+from os import path
+from timeit import default_timer
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..', 'buildbot_inplace'))
+import yaml
+import yaml_loader
+
+WORKER = """name: 'worker%(index)d'
+password: 'secret%(index)d'
+shell: 'bash'
+setupDir: '~/scripts'
+platforms: ['Linux', 'Ubuntu', 'Ubuntu-14.04', 'Ubuntu1404', 'Platform%(mod)d']
+setups: ['qt530_gcc490', 'qt551_gcc520', 'setup%(mod)d']
+"""
+
+PROJECT = """name: 'Project%(index)d'
+repoType: 'git'
+repoUrl: 'https://example.com/project%(index)d.git'
+repoUser: ''
+repoPassword: ''
+"""
+
+
+def generate(directory, template, count):
+    os.makedirs(directory)
+    for index in range(count):
+        with open(path.join(directory, "%05d.yml" % index), 'w') as f:
+            f.write(template % dict(index=index, mod=index % 17))
+
+
+def timed(function):
+    start = default_timer()
+    function()
+    return default_timer() - start
+
+
+def pure_python_load(directory):
+    for file_path in glob(path.join(directory, '*.yml')):
+        with open(file_path, 'r') as s:
+            yaml.load(s, Loader=yaml.SafeLoader)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    base = tempfile.mkdtemp()
+    try:
+        for kind, template in [('workers', WORKER), ('projects', PROJECT)]:
+            directory = path.join(base, kind)
+            generate(directory, template, count)
+            cache = yaml_loader.YamlDirectoryCache()
+            print("%d %s (libyaml: %s)" % (count, kind, yaml_loader.SafeLoader is not yaml.SafeLoader))
+            print("  safe_load          %8.3f s" % timed(lambda: pure_python_load(directory)))
+            print("  cold cache         %8.3f s" % timed(lambda: cache.load(directory, processes)))
+            print("  warm cache         %8.3f s" % timed(lambda: cache.load(directory, processes)))
+            with open(path.join(directory, "%05d.yml" % 0), 'a') as f:
+                f.write("# changed\n")
+            print("  one file changed   %8.3f s" % timed(lambda: cache.load(directory, processes)))
+    finally:
+        shutil.rmtree(base)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+""" Buildbot inplace config
+(C) Copyright 2015 HicknHack Software GmbH
+
+The original code can be found at:
+https://github.com/hicknhack-software/buildbot-inplace-config
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+from twisted.python import log
+from yaml import safe_dump
+from inplace_config import InplaceConfig
+from util import write_atomically
+from yaml_loader import load_yaml_file
+
+
+class BuilderStateFile(object):
+    """ The last inplace config snapshot of each project and when it was last built, stored as YAML """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def load(self):
+        """ Returns project name -> (snapshot id, inplace config, last used) """
+        if not os.path.exists(self.file_path):
+            return {}
+        try:
+            data = load_yaml_file(self.file_path) or {}
+            return dict((project_name, (entry['snapshot'], InplaceConfig(**entry['config']), entry['lastUsed']))
+                        for project_name, entry in data.items())
+        except Exception:
+            log.err(None, "while reading the registered builders from %s" % self.file_path)
+            return {}
+
+    def save(self, entries):
+        data = dict((project_name, dict(snapshot=snapshot_id, config=inplace.as_dict(), lastUsed=last_used))
+                    for project_name, (snapshot_id, inplace, last_used) in entries.items())
+        write_atomically(self.file_path, lambda f: safe_dump(data, f, default_flow_style=False))
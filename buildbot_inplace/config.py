@@ -16,38 +16,35 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import time
+from collections import OrderedDict
+from buildbot.changes.filter import ChangeFilter
 from buildbot.config import BuilderConfig
 from twisted.python import log
 from buildbot.process.factory import BuildFactory
+from buildbot.schedulers.basic import AnyBranchScheduler
 from buildbot.schedulers.forcesched import ForceScheduler
 from buildbot.schedulers.triggerable import Triggerable
+from builder_state import BuilderStateFile
+from delta import ConfigDelta
 from inplace_build import InplaceBuildFactory
+from inplace_config import InplaceConfigCache
+from metrics import PrometheusFileWriter, metrics
+from mirror import MirrorCache
+from named_list import NamedList
+from poller import InplacePoller
 from project import Project
-from setup_build import SetupBuildFactory
-from worker import Worker
+from reconfig_queue import ReconfigQueue
+from resources import ResourceTracker
+from scheduling import BuildDurations, collapse_profile_requests
+from setup_build import FactoryCache, SnapshotBuildFactory
+from snapshots import SnapshotStore
+from steps.setup import EnvironmentCache, EnvironmentParser
+from watcher import DirectoryWatcher
+from worker import Worker, WorkerIndex
+from yaml_loader import yaml_cache
 from pprint import pformat
-
-class NamedList(list):
-    def named_set(self, elem):
-        self.named_del(elem.name)
-        self.append(elem)
-
-    def named_del(self, name):
-        for elem in self:
-            if elem.name == name:
-                self.remove(elem)
-
-    def named_get(self, name):
-        for elem in self:
-            if elem.name == name:
-                return elem
-
-    def clear(self):
-        del self[:]
-
-    @property
-    def names(self):
-        return map(lambda elem: elem.name, self)
+from hashlib import sha1
 
 
 class Wrapper(dict):
@@ -57,6 +54,35 @@ class Wrapper(dict):
         super(Wrapper, self).__init__(**kwargs)
         self._inplace_workers = NamedList()
         self._projects = NamedList()
+        self._worker_index = WorkerIndex()
+        self._worker_files = {}  # path -> (parsed, worker name)
+        self._project_files = {}  # path -> (parsed, project name)
+        self._workers_dir = None
+        self._projects_dir = None
+        self.yaml_processes = 0
+        self.mirror_cache = None
+        self.inplace_cache = InplaceConfigCache()
+        self.snapshots = SnapshotStore()
+        self.builder_state = None
+        self.builder_ttl = None
+        self._last_used = {}  # project name -> time of the last finished build
+        self.poll_changes = False
+        self.collapse_requests = None  # None uses c['collapseRequests']
+        self.environment_cache = EnvironmentCache()
+        self.batch_setups = False
+        self.setup_stage_diffs = False
+        self.path_lists = list(EnvironmentParser.PATH_LISTS)
+        self.lazy_builders = False
+        self.result_cache = False
+        self.result_cache_size = 4096
+        self.duration_scheduling = False
+        self.build_durations = BuildDurations()
+        self.resources = ResourceTracker(self)
+        self.factory_cache = FactoryCache()
+        self._project_builders = {}
+        self._registered_configs = {}
+        self.master_config = None
+        self._reconfig_queue = ReconfigQueue(self, self.RECONFIG_DEBOUNCE)
 
     @property
     def builders(self):
@@ -82,16 +108,203 @@ class Wrapper(dict):
     def projects(self):
         return self._projects
 
+    @property
+    def reconfig_queue(self):
+        return self._reconfig_queue
+
     def named_list(self, key):
         if key not in self:
             self[key] = NamedList()
         return self[key]
 
     def load_workers(self, path):
-        Worker.load(path, self.inplace_workers, self.workers)
+        with metrics.timer('yaml_load', dict(directory='workers')):
+            files = Worker.load(path, self.inplace_workers, self.workers, self.yaml_processes)
+        metrics.count('yaml_files_parsed', yaml_cache.last_parsed, dict(directory='workers'))
+        self._workers_dir = path
+        self._worker_files = dict((file_path, (data, _name_of(data))) for file_path, data in files)
+        self._workers_changed()
 
     def load_projects(self, path):
-        Project.load(path, self.projects)
+        with metrics.timer('yaml_load', dict(directory='projects')):
+            files = Project.load(path, self.projects, self.yaml_processes)
+        metrics.count('yaml_files_parsed', yaml_cache.last_parsed, dict(directory='projects'))
+        self._projects_dir = path
+        self._project_files = dict((file_path, (data, _name_of(data))) for file_path, data in files)
+
+    def watch_directories(self, interval=10):
+        """ Apply changes of the worker and project directories to the running master """
+        self.named_list('services').named_set(DirectoryWatcher(self, interval=interval))
+
+    def persist_builders(self, file_path, ttl=7 * 24 * 3600):
+        """ Keep the profile builders registered after a build and restore them after a restart.
+            Projects without a build for ttl seconds are unregistered. Call before c.setup_inplace() """
+        self.builder_state = BuilderStateFile(file_path)
+        self.builder_ttl = ttl
+
+    def poll_projects(self, interval=5 * 60, max_interval=60 * 60, concurrency=8, branches=None):
+        """ Poll all project repositories with one change source and build changed branches.
+            Call before c.setup_inplace() """
+        self.poll_changes = True
+        self.named_list('change_source').named_set(
+            InplacePoller(self, interval=interval, max_interval=max_interval, concurrency=concurrency,
+                          branches=branches))
+
+    def write_metrics(self, file_path, interval=60):
+        """ Write the inplace metrics periodically in the Prometheus text format """
+        self.named_list('services').named_set(PrometheusFileWriter(file_path, interval=interval))
+
+    def update_from_directories(self):
+        """ Returns the ConfigDelta for added, changed and removed worker and project files.
+            The config itself is updated once the delta was applied to the running master """
+        removed_workers, added_workers = self._file_changes(self._workers_dir, 'workers', self._worker_files, Worker)
+        removed_projects, added_projects = self._file_changes(self._projects_dir, 'projects', self._project_files,
+                                                              Project)
+        delta = ConfigDelta()
+        removed_worker_names = set(name for _, name in removed_workers if name is not None)
+        for name in removed_worker_names:
+            delta.remove_worker(name)
+        workers = []  # (inplace worker, buildbot worker)
+        for _, _, inplace_worker in added_workers:
+            if inplace_worker is not None:
+                workers.append((inplace_worker, inplace_worker.build_worker()))
+                delta.set_worker(workers[-1][1])
+        workers_changed = bool(removed_worker_names or workers)
+        worker_names = [name for name in self.inplace_workers.names if name not in removed_worker_names]
+        worker_names += [inplace_worker.name for inplace_worker, _ in workers
+                         if inplace_worker.name not in worker_names]
+
+        # changed projects keep their snapshots and profile builders, only their project builder is replaced
+        updated_project_names = set(project.name for _, _, project in added_projects if project is not None)
+        removed_project_names = set()
+        for _, name in removed_projects:
+            project = self.projects.named_get(name) if name is not None else None
+            if project is not None and name not in updated_project_names:
+                removed_project_names.add(name)
+                delta.update(self._project_removal_delta(project))
+        builders = []  # (builder, schedulers)
+        if workers_changed:
+            builders.append((BuilderConfig(name=self.DUMMY_NAME, workernames=worker_names, factory=BuildFactory()), []))
+            builders += [self._project_builder(project, worker_names) for project in self.projects
+                         if project.name not in removed_project_names and project.name not in updated_project_names]
+        builders += [self._project_builder(project, worker_names) for _, _, project in added_projects
+                     if project is not None]
+        for builder, schedulers in builders:
+            delta.set_builder(builder)
+            for scheduler in schedulers:
+                delta.set_scheduler(scheduler)
+
+        def commit():
+            self._commit_workers(removed_workers, added_workers, workers)
+            self._commit_projects(removed_projects, added_projects, builders, removed_project_names)
+            if workers_changed:
+                self._workers_changed()
+        delta.on_applied(commit)
+        return delta
+
+    def _file_changes(self, directory, kind, known, model):
+        """ Compares the files of directory with known (path -> (parsed, name)). Returns the removed
+            [(path, name)] and the added [(path, parsed, instance of model)] files.
+            The instance is None for files that are no valid model, they are logged and skipped. """
+        if directory is None:
+            return [], []
+        files = self._load_yaml_files(directory, kind)
+        removed = [(file_path, name) for file_path, (data, name) in known.items()
+                   if not _same_content(files.get(file_path), data)]
+        added = []
+        for file_path, data in files.items():
+            if file_path in known and _same_content(known[file_path][0], data):
+                continue
+            instance = None
+            if isinstance(data, dict):
+                try:
+                    instance = model(**data)
+                except Exception as e:
+                    log.msg("Skipping '%s' until it changes: %s" % (file_path, e), system='Inplace Config')
+            added.append((file_path, data, instance))
+        return removed, added
+
+    def _commit_workers(self, removed, added, workers):
+        for file_path, name in removed:
+            del self._worker_files[file_path]
+            if name is not None:
+                log.msg("Removing Worker '%s'" % name, system='Inplace Config')
+                self.inplace_workers.named_del(name)
+                self.workers.named_del(name)
+        for file_path, data, inplace_worker in added:
+            self._worker_files[file_path] = (data, getattr(inplace_worker, 'name', None))
+        for inplace_worker, worker in workers:
+            log.msg("Adding Worker '%s'" % inplace_worker.name, system='Inplace Config')
+            self.inplace_workers.named_set(inplace_worker)
+            self.workers.named_set(worker)
+
+    def _commit_projects(self, removed, added, builders, removed_names):
+        for file_path, name in removed:
+            del self._project_files[file_path]
+            project = self.projects.named_get(name)
+            if name not in removed_names or project is None:
+                continue
+            log.msg("Removing Project '%s'" % name, system='Inplace Config')
+            self.snapshots.forget(project.name)
+            self._last_used.pop(project.name, None)
+            self._remove_project_builders(project)
+            self.projects.named_del(name)
+            builder_name, trigger_name = _project_builder_names(project)
+            self.builders.named_del(builder_name)
+            for scheduler_name in [trigger_name, _project_change_scheduler_name(project)]:
+                if self.schedulers.named_get(scheduler_name) is not None:
+                    self.schedulers.named_del(scheduler_name)
+        for file_path, data, project in added:
+            self._project_files[file_path] = (data, getattr(project, 'name', None))
+            if project is None:
+                continue
+            if self.projects.named_get(project.name) is not None:
+                log.msg("Updating Project '%s'" % project.name, system='Inplace Config')
+                self._invalidate_project_builders(project.name)
+            else:
+                log.msg("Adding Project '%s'" % project.name, system='Inplace Config')
+            self.projects.named_set(project)
+        for builder, schedulers in builders:
+            self.builders.named_set(builder)
+            for scheduler in schedulers:
+                self.schedulers.named_set(scheduler)
+
+    def _invalidate_project_builders(self, project_name):
+        """ The next registration replaces the profile builders, so they use the changed project """
+        self._registered_configs.pop(project_name, None)
+        registered = self._project_builders.get(project_name, {})
+        for builder_name, (trigger_name, _) in registered.items():
+            registered[builder_name] = (trigger_name, None)
+            self.factory_cache.forget(builder_name)
+
+    def _project_removal_delta(self, project):
+        delta = ConfigDelta()
+        for builder_name, (trigger_name, _) in self._project_builders.get(project.name, {}).items():
+            delta.remove_builder(builder_name)
+            delta.remove_scheduler(trigger_name)
+        builder_name, trigger_name = _project_builder_names(project)
+        delta.remove_builder(builder_name)
+        for scheduler_name in [trigger_name, _project_change_scheduler_name(project)]:
+            if self.schedulers.named_get(scheduler_name) is not None:
+                delta.remove_scheduler(scheduler_name)
+        return delta
+
+    def _workers_changed(self):
+        self._worker_index.rebuild(self.inplace_workers)
+        self._registered_configs.clear()
+        self.environment_cache.clear()
+
+    def _load_yaml_files(self, directory, kind):
+        with metrics.timer('yaml_load', dict(directory=kind)):
+            files = dict(yaml_cache.load(directory, self.yaml_processes))
+        metrics.count('yaml_files_parsed', yaml_cache.last_parsed, dict(directory=kind))
+        return files
+
+    def use_mirror_cache(self, path):
+        """ Read the inplace configs from bare mirrors on the master instead of a worker checkout """
+        self.mirror_cache = MirrorCache(path)
+
+    RECONFIG_DEBOUNCE = 1.0  # seconds to collect registrations of concurrent builds
 
     DUMMY_NAME = "Dummy"
     DUMMY_TRIGGER = "Trigger_Dummy"
@@ -99,49 +312,246 @@ class Wrapper(dict):
     def setup_inplace(self):
         self.builders.clear()
         self.schedulers.clear()
+        self._project_builders.clear()
+        self._registered_configs.clear()
         builder_name = self.DUMMY_NAME
         trigger_name = self.DUMMY_TRIGGER
         worker_names = self.inplace_workers.names
         self.builders.named_set(BuilderConfig(name=builder_name, workernames=worker_names, factory=BuildFactory()))
         self.schedulers.named_set(ForceScheduler(name=trigger_name, builderNames=[builder_name]))
         for project in self.projects:
-            builder_name = "%s_Builder" % project.name
-            trigger_name = "Force_%s_Build" % project.name
-            builder_factory = InplaceBuildFactory(self, project)
-            self.builders.named_set(BuilderConfig(name=builder_name, workernames=worker_names, factory=builder_factory))
-            self.schedulers.named_set(ForceScheduler(name=trigger_name, builderNames=[builder_name]))
+            self._setup_project_builder(project, worker_names)
+        if self.builder_state is not None:
+            self._restore_builders()
+
+    def _restore_builders(self):
+        now = time.time()
+        for project_name, (snapshot_id, inplace, last_used) in self.builder_state.load().items():
+            project = self.projects.named_get(project_name)
+            if project is None or now - last_used > self.builder_ttl:
+                continue
+            log.msg("Restoring builders of Project '%s'" % project_name, system='Inplace Config')
+            self.snapshots.pin(project_name, snapshot_id, inplace)
+            self._last_used[project_name] = last_used
+            self.setup_project_inplace(project)
+
+    def _setup_project_builder(self, project, worker_names):
+        builder, schedulers = self._project_builder(project, worker_names)
+        self.builders.named_set(builder)
+        for scheduler in schedulers:
+            self.schedulers.named_set(scheduler)
+        return builder, schedulers
+
+    def _project_builder(self, project, worker_names):
+        builder_name, trigger_name = _project_builder_names(project)
+        builder_factory = InplaceBuildFactory(self, project)
+        builder = BuilderConfig(name=builder_name, workernames=worker_names, factory=builder_factory,
+                                collapseRequests=self.collapse_requests)
+        schedulers = [ForceScheduler(name=trigger_name, builderNames=[builder_name])]
+        if self.poll_changes:
+            schedulers.append(AnyBranchScheduler(name=_project_change_scheduler_name(project),
+                                                 change_filter=ChangeFilter(project=project.name),
+                                                 builderNames=[builder_name]))
+        return builder, schedulers
 
     def project_profile_worker_names(self, profile):
-        return [worker.name
-                for worker in self.inplace_workers
-                if set(profile.setups).issubset(set(worker.setups))
-                and profile.platform in worker.platforms]
+        return self.resources.fitting_workers(profile, self._worker_index.match(profile.platform, profile.setups))
 
     def setup_project_inplace(self, project):
-        self.setup_inplace()
+        """ Registers the profile builders of all active snapshots of project
+            and returns the ConfigDelta for the running master """
+        versions = self.snapshots.versions(project.name)
+        if self._registered_configs.get(project.name) == versions:
+            return ConfigDelta()  # same snapshots as last time
         for worker in self.inplace_workers:
             log.msg("Got worker '%s' for platform %s and setups %s" %
-                    (worker.name, pformat(worker.platforms), pformat(worker.setups)),
+                    (worker.name, pformat(sorted(worker.platforms)), pformat(sorted(worker.setups))),
                     system='Inplace Config')
-        for profile in project.inplace.profiles:
-            worker_names = self.project_profile_worker_names(profile)
+        profile_versions = OrderedDict()  # builder name -> [(snapshot id, inplace config, profile)]
+        for snapshot_id, inplace in self.snapshots.configs(project.name):
+            for profile in inplace.profiles:
+                builder_name = _project_profile_builder_name(project.name, profile)
+                profile_versions.setdefault(builder_name, []).append((snapshot_id, inplace, profile))
+        wanted = {}
+        for builder_name, profiles in profile_versions.items():
+            worker_names = []
+            for _, _, profile in profiles:
+                worker_names += [name for name in self.project_profile_worker_names(profile)
+                                 if name not in worker_names]
             if not worker_names:
-                log.msg("Failed to find worker for platform '%s' and setups '%s' (project '%s')" %
-                        (profile.platform, pformat(profile.setups), project.name),
-                        system='Inplace Config')
+                profile = profiles[-1][2]
+                if self._worker_index.match(profile.platform, profile.setups):
+                    log.msg("No worker for platform '%s' and setups '%s' can hold %s cores and %s memory "
+                            "for profile '%s' (project '%s')" %
+                            (profile.platform, pformat(profile.setups), profile.cost_cores, profile.cost_memory,
+                             profile.name, project.name),
+                            system='Inplace Config')
+                else:
+                    log.msg("Failed to find worker for platform '%s' and setups '%s' (project '%s')" %
+                            (profile.platform, pformat(profile.setups), project.name),
+                            system='Inplace Config')
                 continue  # profile not executable
+            wanted[builder_name] = (profiles, worker_names)
 
-            builder_name = "_".join([project.name, profile.platform, profile.name])
+        delta = self._remove_project_builders(project, keep=wanted)
+        registered = self._project_builders.setdefault(project.name, {})
+        for builder_name, (profiles, worker_names) in wanted.items():
+            profile = profiles[-1][2]
             trigger_name = _project_profile_trigger_name(project.name, profile)
-            build_factory = SetupBuildFactory(self, project, profile)
-            self.builders.named_set(BuilderConfig(name=builder_name, workernames=worker_names, factory=build_factory))
-            self.schedulers.named_set(Triggerable(name=trigger_name, builderNames=[builder_name]))
+            signature = _builder_signature(profiles, worker_names)
+            build_factory = SnapshotBuildFactory(self, project, builder_name, (profile.platform, profile.name))
+            if not self.lazy_builders:
+                for snapshot_id, inplace, snapshot_profile in profiles:
+                    build_factory.steps_for(snapshot_id, inplace, snapshot_profile)
+            if registered.get(builder_name) == (trigger_name, signature):
+                continue  # unchanged, the registered factory picks up new snapshots by itself
+            builder_kwargs = dict(canStartBuild=self.can_start_build,
+                                  collapseRequests=self._profile_collapse_requests())
+            if self.duration_scheduling:
+                builder_kwargs['nextWorker'] = self.build_durations.next_worker
+            builder = BuilderConfig(name=builder_name, workernames=worker_names, factory=build_factory,
+                                    **builder_kwargs)
+            self.resources.set_cost(builder_name, profile)
+            scheduler = Triggerable(name=trigger_name, builderNames=[builder_name])
+            self.builders.named_set(builder)
+            self.schedulers.named_set(scheduler)
+            delta.set_builder(builder)
+            delta.set_scheduler(scheduler)
+            registered[builder_name] = (trigger_name, signature)
+        self._registered_configs[project.name] = versions
+        return delta
+
+    def _profile_collapse_requests(self):
+        """ Triggered profile requests carry the revision, so the default collapsing has to ignore it """
+        collapse = self.collapse_requests
+        if collapse is None:
+            collapse = self.get('collapseRequests', True)
+        return collapse_profile_requests if collapse is True else collapse
+
+    def can_start_build(self, builder, worker_for_builder, buildrequest):
+        """ canStartBuild for profile builders, the worker has to fit the profile of the snapshot """
+        _, _, profile = builder.config.factory.snapshot(buildrequest.properties)
+        if profile is not None:
+            if worker_for_builder.worker.workername not in self.project_profile_worker_names(profile):
+                return False
+        return self.resources.can_start_build(builder, worker_for_builder, buildrequest)
+
+    def forget_project_builders(self):
+        """ Drops the registrations, e.g. if the running master was reconfigured from master.cfg """
+        for registered in self._project_builders.values():
+            for builder_name, (trigger_name, _) in registered.items():
+                self.builders.named_del(builder_name)
+                self.schedulers.named_del(trigger_name)
+        self._project_builders.clear()
+        self._registered_configs.clear()
+
+    def invalidate_registrations(self):
+        """ A reconfiguration failed, the next registration of every project sends all its builders again """
+        self._registered_configs.clear()
+        for registered in self._project_builders.values():
+            for builder_name, (trigger_name, _) in registered.items():
+                registered[builder_name] = (trigger_name, None)
 
-    def project_trigger_names(self, project):
+    def reset_project_inplace(self, project, snapshot_id):
+        """ Releases the snapshot of a finished build. Unregisters the profile builders that
+            no active snapshot of project needs and returns the ConfigDelta for the running master """
+        persist = self.builder_state is not None and snapshot_id is not None
+        if persist:
+            self.snapshots.pin(project.name, snapshot_id, self.snapshots.get(project.name, snapshot_id))
+            self._last_used[project.name] = time.time()
+        self.snapshots.release(project.name, snapshot_id)
+        if self.snapshots.versions(project.name):
+            delta = self.setup_project_inplace(project)
+        else:
+            delta = self._remove_project_builders(project)
+        if persist:
+            delta.update(self._evict_idle_projects())
+            self._save_builders()
+        return delta
+
+    def _evict_idle_projects(self):
+        delta = ConfigDelta()
+        now = time.time()
+        for project_name, last_used in self._last_used.items():
+            if now - last_used <= self.builder_ttl:
+                continue
+            if self.snapshots.versions(project_name) != (self.snapshots.pinned(project_name),):
+                continue  # builds are running
+            log.msg("Unregistering idle Project '%s'" % project_name, system='Inplace Config')
+            del self._last_used[project_name]
+            self.snapshots.unpin(project_name)
+            project = self.projects.named_get(project_name)
+            if project is not None:
+                delta.update(self._remove_project_builders(project))
+        return delta
+
+    def _save_builders(self):
+        entries = {}
+        for project_name, last_used in self._last_used.items():
+            snapshot_id = self.snapshots.pinned(project_name)
+            if snapshot_id is not None:
+                entries[project_name] = (snapshot_id, self.snapshots.get(project_name, snapshot_id), last_used)
+        try:
+            self.builder_state.save(entries)
+        except (IOError, OSError):
+            log.err(None, "while writing the registered builders to %s" % self.builder_state.file_path)
+
+    def _remove_project_builders(self, project, keep=()):
+        delta = ConfigDelta()
+        self._registered_configs.pop(project.name, None)
+        registered = self._project_builders.get(project.name, {})
+        for builder_name in [name for name in registered if name not in keep]:
+            trigger_name, _ = registered.pop(builder_name)
+            self.resources.remove(builder_name)
+            self.builders.named_del(builder_name)
+            self.schedulers.named_del(trigger_name)
+            delta.remove_builder(builder_name)
+            delta.remove_scheduler(trigger_name)
+        return delta
+
+    def project_trigger_names(self, project, inplace, changed_files=None):
+        return [trigger_name for trigger_name, _ in self.project_triggers(project, inplace, changed_files)]
+
+    def project_triggers(self, project, inplace, changed_files=None):
+        """ (trigger name, builder name) of all executable profiles of inplace matching changed_files """
+        if inplace is None:
+            return []  # the project was removed while it was built
         return [
-            _project_profile_trigger_name(project.name, profile)
-            for profile in project.inplace.profiles
-            if self.project_profile_worker_names(profile)]
+            (_project_profile_trigger_name(project.name, profile), _project_profile_builder_name(project.name, profile))
+            for profile in inplace.profiles
+            if profile.matches(changed_files) and self.project_profile_worker_names(profile)]
+
+
+def _same_content(data, other):
+    return data is other or data == other
+
+
+def _name_of(data):
+    return data.get('name') if isinstance(data, dict) else None
+
+
+def _project_builder_names(project):
+    return "%s_Builder" % project.name, "Force_%s_Build" % project.name
+
+
+def _project_change_scheduler_name(project):
+    return "Changes_%s" % project.name
+
+
+def _project_profile_builder_name(project_name, profile):
+    return "_".join([project_name, profile.platform, profile.name])
+
 
 def _project_profile_trigger_name(project_name, profile):
     return "_".join([project_name, profile.platform, profile.name, "Trigger"])
+
+
+def _builder_signature(profiles, worker_names):
+    """ profiles are the (snapshot id, inplace config, profile) of all active snapshots """
+    contents = []
+    for _, inplace, profile in profiles:
+        commands = [(pc.name, pc.commands, pc.paths, pc.exclude_paths) for pc in inplace.profile_commands(profile)]
+        content = (profile.key, commands)
+        if content not in contents:
+            contents.append(content)
+    return sha1(repr((worker_names, contents))).hexdigest()
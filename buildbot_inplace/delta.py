@@ -0,0 +1,156 @@
+""" Buildbot inplace config
+(C) Copyright 2015 HicknHack Software GmbH
+
+The original code can be found at:
+https://github.com/hicknhack-software/buildbot-inplace-config
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from collections import OrderedDict
+from copy import copy
+
+
+class ConfigDelta(object):
+    """ Workers, builders and schedulers that have to be added, replaced or removed in a running master """
+
+    def __init__(self):
+        self.workers = OrderedDict()
+        self.builders = OrderedDict()
+        self.schedulers = OrderedDict()
+        self.removed_workers = set()
+        self.removed_builders = set()
+        self.removed_schedulers = set()
+        self._on_applied = []
+
+    def on_applied(self, callback):
+        """ callback is called once the delta was applied to the running master """
+        self._on_applied.append(callback)
+
+    def applied(self):
+        for callback in self._on_applied:
+            callback()
+
+    def set_worker(self, worker):
+        self.removed_workers.discard(worker.name)
+        self.workers[worker.name] = worker
+
+    def remove_worker(self, name):
+        self.workers.pop(name, None)
+        self.removed_workers.add(name)
+
+    def set_builder(self, builder):
+        self.removed_builders.discard(builder.name)
+        self.builders[builder.name] = builder
+
+    def remove_builder(self, name):
+        self.builders.pop(name, None)
+        self.removed_builders.add(name)
+
+    def set_scheduler(self, scheduler):
+        self.removed_schedulers.discard(scheduler.name)
+        self.schedulers[scheduler.name] = scheduler
+
+    def remove_scheduler(self, name):
+        self.schedulers.pop(name, None)
+        self.removed_schedulers.add(name)
+
+    def update(self, other):
+        """ Merges a later delta into this one """
+        for name in other.removed_workers:
+            self.remove_worker(name)
+        for worker in other.workers.values():
+            self.set_worker(worker)
+        for name in other.removed_builders:
+            self.remove_builder(name)
+        for builder in other.builders.values():
+            self.set_builder(builder)
+        for name in other.removed_schedulers:
+            self.remove_scheduler(name)
+        for scheduler in other.schedulers.values():
+            self.set_scheduler(scheduler)
+        self._on_applied += other._on_applied
+
+    def removals(self):
+        """ A delta with only the removals of this one """
+        delta = ConfigDelta()
+        delta.removed_workers = set(self.removed_workers)
+        delta.removed_builders = set(self.removed_builders)
+        delta.removed_schedulers = set(self.removed_schedulers)
+        return delta
+
+    def __len__(self):
+        return (len(self.workers) + len(self.builders) + len(self.schedulers) +
+                len(self.removed_workers) + len(self.removed_builders) + len(self.removed_schedulers))
+
+    def __nonzero__(self):
+        return len(self) > 0
+
+    def apply(self, master_config):
+        """ Returns a copy of master_config with this delta applied.
+            Only the touched entries are validated. """
+        try:
+            new_config = copy(master_config)
+            new_config.workers = _apply_named(master_config.workers, self.workers, self.removed_workers)
+            new_config.builders = self._prune_workers(
+                _apply_named(master_config.builders, self.builders, self.removed_builders))
+            new_config.schedulers = self._apply_schedulers(master_config.schedulers)
+            self._check_builders(new_config)
+            self._check_schedulers(new_config)
+        except Exception as e:
+            raise Exception("Could not reconfigure Buildbot: " + str(e))
+        return new_config
+
+    def _prune_workers(self, builders):
+        """ Removed workers are dropped from all builders, e.g. profile builders registered before """
+        if not self.removed_workers:
+            return builders
+        result = []
+        for builder in builders:
+            if self.removed_workers.intersection(builder.workernames):
+                builder = copy(builder)
+                builder.workernames = [name for name in builder.workernames if name not in self.removed_workers]
+            result.append(builder)
+        return result
+
+    def _apply_schedulers(self, schedulers):
+        result = dict(schedulers)
+        for name in self.removed_schedulers:
+            result.pop(name, None)
+        result.update(self.schedulers)
+        return result
+
+    def _check_builders(self, master_config):
+        worker_names = set(worker.name for worker in master_config.workers)
+        builders = master_config.builders if self.removed_workers else self.builders.values()
+        for builder in builders:
+            unknown = set(builder.workernames) - worker_names
+            if unknown:
+                raise ValueError("builder '%s' uses unknown workers %s" % (builder.name, ", ".join(sorted(unknown))))
+
+    def _check_schedulers(self, master_config):
+        builder_names = set(builder.name for builder in master_config.builders)
+        for scheduler in master_config.schedulers.values():
+            unknown = set(scheduler.listBuilderNames()) - builder_names
+            if unknown:
+                raise ValueError("scheduler '%s' uses unknown builders %s" % (scheduler.name, ", ".join(sorted(unknown))))
+
+
+def _apply_named(elems, changed, removed):
+    result = []
+    for elem in elems:
+        if elem.name in removed:
+            continue
+        result.append(changed.get(elem.name, elem))
+    known_names = set(elem.name for elem in elems)
+    result.extend(elem for name, elem in changed.items() if name not in known_names)
+    return result
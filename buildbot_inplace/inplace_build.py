@@ -19,25 +19,44 @@ limitations under the License.
 from buildbot.process.factory import BuildFactory
 from twisted.internet import defer
 from buildbot.steps.trigger import Trigger
-from steps.checkout import create_checkout_step
+from buildbot.status.builder import SUCCESS, WARNINGS
+from metrics import TimedStepMixin
+from snapshots import SNAPSHOT_PROPERTY
+from steps.changes import AnalyzeChangesStep, CHANGED_FILES_PROPERTY, set_last_good_revision
+from steps.checkout import create_checkout_step, create_reference_step
 from steps.reconfig_buildmaster import ReconfigBuildmasterStep
-from steps.retrieve_inplace import RetrieveInplaceConfigStep
+from steps.result_cache import CACHE_BYPASS_PROPERTY
+from steps.retrieve_inplace import RetrieveInplaceConfigStep, RetrieveMirroredInplaceConfigStep
 
 
 def trigger_name(project_name, platform_name):
     return "%(project_name)s_%(platform_name)s_Trigger" % locals()
 
 
-class InplaceTriggerBuilds(Trigger):
+class InplaceTriggerBuilds(TimedStepMixin, Trigger):
+    metric_phase = 'trigger'
+
     def __init__(self, config, project, **kwargs):
-        super(InplaceTriggerBuilds, self).__init__(schedulerNames=["dummy"], **kwargs)
+        copy_properties = [CHANGED_FILES_PROPERTY, SNAPSHOT_PROPERTY, CACHE_BYPASS_PROPERTY]
+        super(InplaceTriggerBuilds, self).__init__(schedulerNames=["dummy"], copy_properties=copy_properties,
+                                                   **kwargs)
         self.config = config
         self.project = project
 
     @defer.inlineCallbacks
     def run(self):
-        self.schedulerNames = self.config.project_trigger_names(self.project)
+        changed_files = self.getProperty(CHANGED_FILES_PROPERTY)
+        inplace = self.config.snapshots.get(self.project.name, self.getProperty(SNAPSHOT_PROPERTY))
+        triggers = self.config.project_triggers(self.project, inplace, changed_files)
+        if self.config.duration_scheduling:
+            durations = self.config.build_durations
+            yield durations.refresh(self.master, [builder_name for _, builder_name in triggers])
+            triggers.sort(key=lambda trigger: durations.longest_first(trigger[1]))
+        self.schedulerNames = [trigger_name for trigger_name, _ in triggers]
         rv = yield super(InplaceTriggerBuilds, self).run()
+        revision = self.getProperty('got_revision')
+        if rv in (SUCCESS, WARNINGS) and revision:
+            yield set_last_good_revision(self.master, self.project, self.getProperty('branch'), revision)
         defer.returnValue(rv)
 
 
@@ -54,8 +73,17 @@ class InplaceBuildFactory(BuildFactory):
 
     def __init__(self, config, project):
         super(InplaceBuildFactory, self).__init__()
-        self.addStep(create_checkout_step(project))
-        self.addStep(RetrieveInplaceConfigStep(project, haltOnFailure=True))
+        if config.mirror_cache:
+            self.addStep(RetrieveMirroredInplaceConfigStep(project, config.mirror_cache, config.inplace_cache,
+                                                           config.snapshots, haltOnFailure=True))
+        else:
+            reference_step = create_reference_step(project, config.inplace_workers)
+            if reference_step:
+                self.addStep(reference_step)
+            self.addStep(create_checkout_step(project, config.inplace_workers))
+            self.addStep(RetrieveInplaceConfigStep(project, config.inplace_cache, config.snapshots,
+                                                   haltOnFailure=True))
+        self.addStep(AnalyzeChangesStep(project, config.snapshots, config.mirror_cache))
         self.addStep(ReconfigBuildmasterStep(config, project,
                                              update_from_project=True,
                                              haltOnFailure=True,
@@ -66,4 +94,5 @@ class InplaceBuildFactory(BuildFactory):
                                           **self.TRIGGER_DICT))
         self.addStep(ReconfigBuildmasterStep(config, project,
                                              update_from_project=False,
+                                             alwaysRun=True,
                                              **self.RESET_DICT))
@@ -16,64 +16,214 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from yaml import safe_load
+from collections import OrderedDict
+from fnmatch import fnmatch
+from hashlib import sha1
+from yaml_loader import load_yaml
 from buildbot.util import flatten
+from model import Frozen, required, tag, tags
 
 
-class Profile(dict):
-    @property
-    def name(self):
-        return self['name']
+class Profile(Frozen):
+    __slots__ = ('name', 'platform', 'command_key', 'setups', 'paths', 'exclude_paths', 'cost_cores', 'cost_memory')
 
-    @property
-    def platform(self):
-        return self['platform']
+    def __init__(self, **data):
+        kind = "Profile '%s'" % required(data, 'name', "Profile")
+        cost = data.get('cost') or {}
+        self._init(name=data['name'],
+                   platform=tag(required(data, 'platform', kind)),
+                   command_key=tag(required(data, 'commands', kind)),
+                   setups=tags(data.get('setups', data.get('setup', []))),
+                   paths=tuple(flatten([data.get('paths', [])])),
+                   exclude_paths=tuple(flatten([data.get('excludePaths', [])])),
+                   cost_cores=cost.get('cores', 1),
+                   cost_memory=cost.get('memory', 0))
 
     @property
-    def command_key(self):
-        return self['commands']
+    def key(self):
+        """ All values, compared for the builder and result cache signatures """
+        return tuple((name, getattr(self, name)) for name in self.__slots__)
 
-    @property
-    def setups(self):
-        return flatten([self.get('setups', self.get('setup',[]))])
+    def as_dict(self):
+        return dict(name=self.name, platform=self.platform, commands=self.command_key, setups=list(self.setups),
+                    paths=list(self.paths), excludePaths=list(self.exclude_paths),
+                    cost=dict(cores=self.cost_cores, memory=self.cost_memory))
 
+    def matches(self, changed_files):
+        return matches_paths(changed_files, self.paths, self.exclude_paths)
 
-class Action(dict):
-    @property
-    def name(self):
-        return self['name']
+
+class Action(Frozen):
+    RESERVED_KEYS = ['name', 'needs', 'paths', 'excludePaths']
+
+    __slots__ = ('name', 'needs', 'paths', 'exclude_paths', 'commands')
+
+    def __init__(self, **data):
+        required(data, 'name', "Action")
+        needs = data.get('needs')
+        self._init(name=data['name'],
+                   needs=None if needs is None else tuple(flatten([needs])),
+                   paths=tuple(flatten([data.get('paths', [])])),
+                   exclude_paths=tuple(flatten([data.get('excludePaths', [])])),
+                   commands=dict((tag(key), tuple(flatten(value)) if isinstance(value, list) else value)
+                                 for key, value in data.items() if key not in self.RESERVED_KEYS))
 
     @property
     def command_keys(self):
-        return [key for key in self.keys() if key != 'name']
+        return self.commands.keys()
 
     def commands_for_key(self, key):
-        return flatten([self.get(key)])
+        return flatten([self.commands.get(key, [])], types=(list, tuple))
+
+    def as_dict(self):
+        data = dict((key, list(commands) if isinstance(commands, tuple) else commands)
+                    for key, commands in self.commands.items())
+        data.update(name=self.name, paths=list(self.paths), excludePaths=list(self.exclude_paths))
+        if self.needs is not None:
+            data['needs'] = list(self.needs)
+        return data
+
 
+class ProfileCommand(Frozen):
+    __slots__ = ('name', 'commands', 'paths', 'exclude_paths')
 
-class ProfileCommand:
-    def __init__(self, name, commands):
-        self.name = name
-        self.commands = commands
+    def __init__(self, name, commands, paths=(), exclude_paths=()):
+        self._init(name=name, commands=commands, paths=paths, exclude_paths=exclude_paths)
+
+    @property
+    def has_path_filter(self):
+        return bool(self.paths or self.exclude_paths)
+
+    def matches(self, changed_files):
+        return matches_paths(changed_files, self.paths, self.exclude_paths)
 
 
-class InplaceConfig:
+class InplaceConfig(object):
+    """ The parsed .buildbot.yml. The commands and stages of each command key are computed once. """
+
     def __init__(self, profiles, actions):
-        self.profiles = [Profile(**profile_dict) for profile_dict in profiles]
-        self.actions = [Action(**action_dict) for action_dict in actions]
+        self.profiles = tuple(Profile(**profile_dict) for profile_dict in profiles)
+        self.actions = tuple(Action(**action_dict) for action_dict in actions)
+        self._dependencies = self._action_dependencies()
+        self._commands = {}  # command key -> [ProfileCommand]
+        self._stages = {}  # command key -> [[ProfileCommand]]
+
+    def as_dict(self):
+        return dict(profiles=[profile.as_dict() for profile in self.profiles],
+                    actions=[action.as_dict() for action in self.actions])
 
     @property
     def platform_names(self):
         return [profile.platform for profile in self.profiles]
 
+    @property
+    def has_path_filters(self):
+        return any(item.paths or item.exclude_paths for item in self.profiles + self.actions)
+
     def profile_commands(self, profile):
-        all_commands = [ProfileCommand(action.name, action.commands_for_key(profile.command_key))
-                        for action in self.actions]
-        return [cmd for cmd in all_commands if cmd.commands]
+        key = profile.command_key
+        if key not in self._commands:
+            all_commands = [ProfileCommand(action.name, action.commands_for_key(key),
+                                           action.paths, action.exclude_paths)
+                            for action in self.actions]
+            self._commands[key] = [cmd for cmd in all_commands if cmd.commands]
+        return self._commands[key]
+
+    def profile_stages(self, profile):
+        """ Groups the profile commands into stages of independent actions """
+        key = profile.command_key
+        if key not in self._stages:
+            self._stages[key] = self._profile_stages(profile)
+        return self._stages[key]
+
+    def _profile_stages(self, profile):
+        commands = dict((cmd.name, cmd) for cmd in self.profile_commands(profile))
+        levels = {}
+        stages = []
+        for action in self.actions:
+            level = max([levels[name] for name in self._dependencies[action.name]] or [0])
+            if action.name in commands:
+                level += 1
+                if level > len(stages):
+                    stages.append([])
+                stages[level - 1].append(commands[action.name])
+            levels[action.name] = level
+        return stages
+
+    def _action_dependencies(self):
+        names = [action.name for action in self.actions]
+        dependencies = {}
+        for index, action in enumerate(self.actions):
+            needs = action.needs
+            if needs is None:
+                needs = names[index - 1:index]
+            for name in needs:
+                if name not in names:
+                    raise Exception("Action '%s' needs unknown action '%s'" % (action.name, name))
+                if names.index(name) >= index:
+                    raise Exception("Action '%s' needs '%s' which is not declared before" % (action.name, name))
+            dependencies[action.name] = needs
+        return dependencies
 
     @staticmethod
     def from_text(yaml_text):
-        inplace_dict = safe_load(yaml_text)
+        inplace_dict = load_yaml(yaml_text)
         if not isinstance(inplace_dict, dict):
             return
         return InplaceConfig(**inplace_dict)
+
+
+def matches_paths(changed_files, paths, exclude_paths):
+    """ True if any changed file matches one of paths (all by default) and none of exclude_paths.
+        Unknown changes (None) always match. """
+    if changed_files is None:
+        return True
+    for changed_file in changed_files:
+        if paths and not any(fnmatch(changed_file, pattern) for pattern in paths):
+            continue
+        if any(fnmatch(changed_file, pattern) for pattern in exclude_paths):
+            continue
+        return True
+    return False
+
+
+def blob_id(text):
+    """ sha1 of the UTF-8 bytes of text in the format of a git blob id. It only equals the id of the committed
+        file for its exact bytes, text read line by line from a worker lacks the final newline """
+    data = text.encode('utf-8') if isinstance(text, unicode) else text
+    return sha1("blob %d\0" % len(data) + data).hexdigest()
+
+
+class InplaceConfigCache(object):
+    """ Bounded LRU cache of parsed inplace configs keyed by git blob id """
+
+    def __init__(self, size=256):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._configs = OrderedDict()
+
+    def get(self, key):
+        inplace_config = self._configs.pop(key, None)
+        if inplace_config is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._configs[key] = inplace_config
+        return inplace_config
+
+    def put(self, key, inplace_config):
+        self._configs.pop(key, None)
+        self._configs[key] = inplace_config
+        while len(self._configs) > self.size:
+            self._configs.popitem(last=False)
+
+    def from_text(self, yaml_text, key=None):
+        if key is None:
+            key = blob_id(yaml_text)
+        inplace_config = self.get(key)
+        if inplace_config is None:
+            inplace_config = InplaceConfig.from_text(yaml_text)
+            if inplace_config is not None:
+                self.put(key, inplace_config)
+        return inplace_config
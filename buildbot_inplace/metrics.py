@@ -0,0 +1,141 @@
+""" Buildbot inplace config
+(C) Copyright 2015 HicknHack Software GmbH
+
+The original code can be found at:
+https://github.com/hicknhack-software/buildbot-inplace-config
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import time
+from collections import defaultdict
+from twisted.internet import defer
+from twisted.python import log
+from buildbot.process.metrics import MetricCountEvent, MetricTimeEvent
+from util import LoopingService, write_atomically
+
+
+class InplaceMetrics(object):
+    """ Durations and counts of the inplace pipeline, labeled by project, worker or setup.
+        Every value is also logged to the Buildbot metrics service. """
+
+    def __init__(self):
+        self._timings = defaultdict(lambda: [0, 0.0])  # (name, labels) -> [count, seconds]
+        self._counters = defaultdict(int)  # (name, labels) -> value
+
+    def record_time(self, name, seconds, labels=None):
+        timing = self._timings[(name, _label_key(labels))]
+        timing[0] += 1
+        timing[1] += seconds
+        MetricTimeEvent.log("inplace.%s" % name, seconds)
+
+    def count(self, name, value=1, labels=None):
+        self._counters[(name, _label_key(labels))] += value
+        MetricCountEvent.log("inplace.%s" % name, value)
+
+    def timer(self, name, labels=None):
+        return _Timer(self, name, labels)
+
+    def clear(self):
+        self._timings.clear()
+        self._counters.clear()
+
+    def prometheus_text(self):
+        lines = []
+        for name in sorted(set(name for name, _ in self._timings)):
+            metric = "inplace_%s_seconds" % name
+            lines.append("# TYPE %s summary" % metric)
+            for (timing_name, labels), (count, seconds) in sorted(self._timings.items()):
+                if timing_name == name:
+                    lines.append("%s_sum%s %f" % (metric, _format_labels(labels), seconds))
+                    lines.append("%s_count%s %d" % (metric, _format_labels(labels), count))
+        for name in sorted(set(name for name, _ in self._counters)):
+            metric = "inplace_%s_total" % name
+            lines.append("# TYPE %s counter" % metric)
+            for (counter_name, labels), value in sorted(self._counters.items()):
+                if counter_name == name:
+                    lines.append("%s%s %d" % (metric, _format_labels(labels), value))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, file_path):
+        text = self.prometheus_text()
+        write_atomically(file_path, lambda f: f.write(text))
+
+
+class _Timer(object):
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.record_time(self.name, time.time() - self.started, self.labels)
+
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(label_key):
+    if not label_key:
+        return ""
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in label_key]
+    return "{%s}" % ",".join('%s="%s"' % item for item in escaped)
+
+
+class TimedStepMixin(object):
+    """ Records the duration of a step as phase metric_phase, labeled by its project """
+
+    metric_phase = None
+
+    def metric_labels(self):
+        project = getattr(self, 'project', None)
+        return dict(project=project.name) if project is not None else {}
+
+    @defer.inlineCallbacks
+    def startStep(self, remote):
+        started = time.time()
+        try:
+            results = yield super(TimedStepMixin, self).startStep(remote)
+        finally:
+            labels = dict(self.metric_labels(), phase=self.metric_phase)
+            metrics.record_time('phase', time.time() - started, labels)
+        defer.returnValue(results)
+
+
+class PrometheusFileWriter(LoopingService):
+    """ Periodically writes the metrics in the Prometheus text format, e.g. for the node exporter """
+
+    name = "InplaceMetricsWriter"
+
+    def checkConfig(self, file_path, interval=60):
+        if interval <= 0:
+            raise ValueError("interval has to be positive")
+
+    def reconfigService(self, file_path, interval=60):
+        self.file_path = file_path
+        self.interval = interval
+        self.restart()
+
+    def tick(self):
+        try:
+            metrics.write_prometheus(self.file_path)
+        except (IOError, OSError):
+            log.err(None, "while writing the inplace metrics to %s" % self.file_path)
+
+
+metrics = InplaceMetrics()
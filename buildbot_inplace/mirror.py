@@ -0,0 +1,88 @@
+""" Buildbot inplace config
+(C) Copyright 2015 HicknHack Software GmbH
+
+The original code can be found at:
+https://github.com/hicknhack-software/buildbot-inplace-config
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+from os import path
+from hashlib import sha1
+from twisted.internet import defer, utils
+from twisted.python import log
+from steps.checkout import set_url_auth
+
+
+class MirrorCache(object):
+    """ Bare mirrors of the project repositories on the master.
+        Files are read with git show, so no worker checkout is needed. """
+
+    GIT = 'git'
+
+    def __init__(self, mirror_dir):
+        self.mirror_dir = path.abspath(mirror_dir)
+        self._locks = {}
+
+    def repo_dir(self, project):
+        return path.join(self.mirror_dir, sha1(project.repo_url).hexdigest())
+
+    @defer.inlineCallbacks
+    def update(self, project):
+        """ Clones or fetches the mirror of project. Concurrent updates of one mirror are serialized. """
+        lock = self._locks.setdefault(project.repo_url, defer.DeferredLock())
+        yield lock.acquire()
+        try:
+            repo_dir = self.repo_dir(project)
+            if path.isdir(repo_dir):
+                yield self._git(['fetch', '--prune', '--quiet', 'origin'], repo_dir)
+            else:
+                if not path.isdir(self.mirror_dir):
+                    os.makedirs(self.mirror_dir)
+                log.msg("Creating mirror of '%s' in %s" % (project.repo_url, repo_dir), system='Inplace Config')
+                repo_url = set_url_auth(project.repo_url, project.repo_user, project.repo_password)
+                yield self._git(['clone', '--mirror', '--quiet', repo_url, repo_dir], self.mirror_dir)
+        finally:
+            lock.release()
+
+    @defer.inlineCallbacks
+    def rev_parse(self, project, rev):
+        output = yield self._git(['rev-parse', '--verify', '%s^{commit}' % rev], self.repo_dir(project))
+        defer.returnValue(output.strip())
+
+    @defer.inlineCallbacks
+    def blob_id(self, project, rev, file_path):
+        output = yield self._git(['rev-parse', '--verify', '%s:%s' % (rev, file_path)], self.repo_dir(project))
+        defer.returnValue(output.strip())
+
+    @defer.inlineCallbacks
+    def changed_files(self, project, from_rev, to_rev):
+        output = yield self._git(['diff', '--name-only', from_rev, to_rev], self.repo_dir(project))
+        defer.returnValue(output)
+
+    @defer.inlineCallbacks
+    def commit_info(self, project, rev):
+        """ (author, comments, timestamp) of a commit """
+        output = yield self._git(['log', '-1', '--format=%an <%ae>%n%at%n%B', rev], self.repo_dir(project))
+        author, timestamp, comments = (output.split('\n', 2) + ['', ''])[:3]
+        defer.returnValue((author, comments.strip(), int(timestamp) if timestamp else None))
+
+    def show(self, project, rev, file_path):
+        return self._git(['show', '%s:%s' % (rev, file_path)], self.repo_dir(project))
+
+    @defer.inlineCallbacks
+    def _git(self, args, cwd):
+        out, err, code = yield utils.getProcessOutputAndValue(self.GIT, args, env=os.environ, path=cwd)
+        if code != 0:
+            raise Exception("git %s failed: %s" % (args[0], err.strip()))
+        defer.returnValue(out)
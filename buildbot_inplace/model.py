@@ -0,0 +1,51 @@
+""" Buildbot inplace config
+(C) Copyright 2015 HicknHack Software GmbH
+
+The original code can be found at:
+https://github.com/hicknhack-software/buildbot-inplace-config
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from buildbot.util import flatten
+
+
+class Frozen(object):
+    """ Base of the slotted model classes. Values are validated and assigned once in __init__. """
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s objects are immutable" % type(self).__name__)
+
+    def _init(self, **values):
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, getattr(self, 'name', ''))
+
+
+def required(data, key, kind):
+    if key not in data:
+        raise Exception("%s is missing '%s'" % (kind, key))
+    return data[key]
+
+
+def tag(value):
+    """ Interns tag strings, so thousands of workers and profiles share them """
+    return intern(value) if type(value) is str else value
+
+
+def tags(value):
+    """ Tuple of interned tags from a tag or a (nested) list of them """
+    return tuple(tag(item) for item in flatten([value]))
@@ -0,0 +1,110 @@
+""" Buildbot inplace config
+(C) Copyright 2015 HicknHack Software GmbH
+
+The original code can be found at:
+https://github.com/hicknhack-software/buildbot-inplace-config
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+class NamedList(list):
+    """ A list of named elements that keeps an index by name.
+        Buildbot still reads it as a plain list. Elements replaced by named_set keep their position. """
+
+    REINDEX_AFTER = 32  # deletions before all positions are recomputed
+
+    def __init__(self, *args):
+        super(NamedList, self).__init__(*args)
+        self._invalidate()
+
+    def named_set(self, elem):
+        by_name = self._by_name()
+        if elem.name in by_name:
+            list.__setitem__(self, self._position(elem.name), elem)
+        else:
+            self._positions[elem.name] = len(self)
+            list.append(self, elem)
+        by_name[elem.name] = elem
+
+    def named_del(self, name):
+        if name not in self._by_name():
+            return
+        position = self._position(name)
+        del self._elems[name]
+        del self._positions[name]
+        list.__delitem__(self, position)
+        self._deleted += 1
+
+    def named_get(self, name):
+        return self._by_name().get(name)
+
+    def clear(self):
+        list.__delitem__(self, slice(None))
+        self._invalidate()
+
+    @property
+    def names(self):
+        return [elem.name for elem in self]
+
+    # plain list modifications keep the index consistent
+    def append(self, elem):
+        self.named_set(elem)
+
+    def extend(self, elems):
+        for elem in elems:
+            self.named_set(elem)
+
+    def __iadd__(self, elems):
+        self.extend(elems)
+        return self
+
+    def _invalidating(method):
+        def wrapper(self, *args, **kwargs):
+            result = method(self, *args, **kwargs)
+            self._invalidate()
+            return result
+        return wrapper
+
+    __setitem__ = _invalidating(list.__setitem__)
+    __delitem__ = _invalidating(list.__delitem__)
+    insert = _invalidating(list.insert)
+    remove = _invalidating(list.remove)
+    pop = _invalidating(list.pop)
+    sort = _invalidating(list.sort)
+    reverse = _invalidating(list.reverse)
+    if hasattr(list, '__setslice__'):
+        __setslice__ = _invalidating(list.__setslice__)
+        __delslice__ = _invalidating(list.__delslice__)
+    del _invalidating
+
+    def _invalidate(self):
+        self._elems = None  # name -> element, rebuilt on demand
+        self._positions = {}  # name -> index, shifted down by at most _deleted
+        self._deleted = self.REINDEX_AFTER
+
+    def _by_name(self):
+        if self._elems is None:
+            self._elems = dict((elem.name, elem) for elem in self)
+        return self._elems
+
+    def _position(self, name):
+        if self._deleted >= self.REINDEX_AFTER:
+            self._positions = dict((elem.name, index) for index, elem in enumerate(self))
+            self._deleted = 0
+        position = self._positions[name]
+        if self._deleted:
+            elem = self._elems[name]
+            position = list.index(self, elem, max(position - self._deleted, 0), position + 1)
+            self._positions[name] = position
+        return position
@@ -0,0 +1,136 @@
+""" Buildbot inplace config
+(C) Copyright 2015 HicknHack Software GmbH
+
+The original code can be found at:
+https://github.com/hicknhack-software/buildbot-inplace-config
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import time
+from twisted.internet import defer, utils
+from twisted.python import log
+from buildbot.changes import base
+from buildbot.util.state import StateMixin
+from steps.checkout import set_url_auth
+
+
+class InplacePoller(base.PollingChangeSource, StateMixin):
+    """ Polls the branches of all inplace projects with git ls-remote from a single timer.
+        At most concurrency git processes run at once. Projects without changes are polled less often,
+        failing ones back off. """
+
+    compare_attrs = ("interval", "max_interval", "concurrency", "branches", "tick", "name", "projects")
+
+    GIT = 'git'
+    HEADS = 'refs/heads/'
+
+    def __init__(self, config, interval=5 * 60, max_interval=60 * 60, concurrency=8, branches=None, tick=10,
+                 name='InplacePoller'):
+        base.PollingChangeSource.__init__(self, name=name, pollInterval=tick, pollAtLaunch=True)
+        self.config = config
+        self.interval = interval
+        self.max_interval = max_interval
+        self.concurrency = concurrency
+        self.branches = branches
+        self.tick = tick
+        self._semaphore = defer.DeferredSemaphore(concurrency)
+        self._schedule = {}  # project name -> (next poll time, current interval, failures)
+        self._refs = None  # project name -> {branch: revision}
+
+    @property
+    def projects(self):
+        """ Compared on reconfig, so a changed project list replaces the poller and the config it reads """
+        return sorted((project.name, project.repo_type, project.repo_url, project.repo_user, project.repo_password)
+                      for project in self.config.projects)
+
+    def describe(self):
+        return "InplacePoller watching %d projects" % len(self.config.projects)
+
+    @defer.inlineCallbacks
+    def poll(self):
+        if self._refs is None:
+            self._refs = yield self.getState('lastRefs', {})
+        now = time.time()
+        due = [project for project in self.config.projects
+               if project.repo_type == 'git' and self._schedule.get(project.name, (0,))[0] <= now]
+        changed = yield defer.gatherResults([self._semaphore.run(self._poll_project, project) for project in due],
+                                            consumeErrors=True)
+        if any(changed):
+            yield self.setState('lastRefs', self._refs)
+
+    @defer.inlineCallbacks
+    def _poll_project(self, project):
+        """ Returns True if the branches of project changed """
+        _, interval, failures = self._schedule.get(project.name, (0, self.interval, 0))
+        try:
+            refs = yield self._remote_branches(project)
+        except Exception as e:
+            failures += 1
+            backoff = min(self.interval * 2 ** failures, self.max_interval)
+            log.msg("Polling project '%s' failed, retrying in %ds: %s" % (project.name, backoff, e),
+                    system='Inplace Config')
+            self._schedule[project.name] = (time.time() + backoff, interval, failures)
+            defer.returnValue(False)
+
+        last_refs = self._refs.get(project.name)
+        changed_branches = [branch for branch, revision in sorted(refs.items())
+                            if last_refs is not None and last_refs.get(branch) != revision]
+        for branch in changed_branches:
+            yield self._add_change(project, branch, refs[branch])
+        if changed_branches:
+            interval = self.interval
+        else:
+            interval = min(interval * 1.5, self.max_interval)
+        self._schedule[project.name] = (time.time() + interval, interval, 0)
+        self._refs[project.name] = refs
+        defer.returnValue(refs != last_refs)
+
+    @defer.inlineCallbacks
+    def _remote_branches(self, project):
+        repo_url = set_url_auth(project.repo_url, project.repo_user, project.repo_password)
+        out, err, code = yield utils.getProcessOutputAndValue(self.GIT, ['ls-remote', '--heads', repo_url],
+                                                              env=os.environ)
+        if code != 0:
+            raise Exception("git ls-remote failed: %s" % err.strip())
+        refs = {}
+        for line in out.splitlines():
+            revision, _, ref = line.partition('\t')
+            if not ref.startswith(self.HEADS):
+                continue
+            branch = ref[len(self.HEADS):]
+            if self.branches is None or branch in self.branches:
+                refs[branch] = revision
+        defer.returnValue(refs)
+
+    @defer.inlineCallbacks
+    def _add_change(self, project, branch, revision):
+        author, comments, when = 'unknown', '', None
+        mirror = self.config.mirror_cache
+        if mirror:
+            try:
+                yield mirror.update(project)
+                author, comments, when = yield mirror.commit_info(project, revision)
+            except Exception:
+                log.err(None, "while reading commit %s of project '%s'" % (revision, project.name))
+        log.msg("Project '%s' branch '%s' changed to %s" % (project.name, branch, revision),
+                system='Inplace Config')
+        yield self.master.data.updates.addChange(author=author,
+                                                 revision=revision,
+                                                 files=[],
+                                                 comments=comments,
+                                                 when_timestamp=when,
+                                                 branch=branch,
+                                                 project=project.name,
+                                                 repository=project.repo_url,
+                                                 src='git')
@@ -17,52 +17,32 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-from glob import glob
-from os import path
-from yaml import safe_load
+from model import Frozen, required
+from yaml_loader import yaml_cache
 
 
-class Project(dict):
-    @property
-    def name(self):
-        return self['name']
+class Project(Frozen):
+    __slots__ = ('name', 'repo_type', 'repo_url', 'repo_user', 'repo_password', 'shallow')
 
-    @property
-    def repo_type(self):
-        return self['repoType']
-
-    @property
-    def repo_url(self):
-        return self['repoUrl']
-
-    @property
-    def repo_user(self):
-        return self['repoUser']
-
-    @property
-    def repo_password(self):
-        return self['repoPassword']
-
-    @property
-    def inplace(self):
-        return self.get('inplace')
-
-    @inplace.setter
-    def inplace(self, value):
-        self['inplace'] = value
+    def __init__(self, **data):
+        kind = "Project '%s'" % required(data, 'name', "Project")
+        self._init(name=data['name'],
+                   repo_type=required(data, 'repoType', kind),
+                   repo_url=required(data, 'repoUrl', kind),
+                   repo_user=data.get('repoUser'),
+                   repo_password=data.get('repoPassword'),
+                   shallow=data.get('shallow', False))
 
     @staticmethod
-    def load(projects_path, projects):
-        files = glob(path.join(projects_path, "*.yml"))
+    def load(projects_path, projects, processes=0):
+        files = yaml_cache.load(projects_path, processes)
         if not files:
             raise Exception("No projects found in %s!" % projects_path)
 
         projects.clear()
-        for project_file in files:
-            s = open(project_file, 'r')
-            project_dict = safe_load(s)
-            s.close()
+        for _, project_dict in files:
             if not isinstance(project_dict, dict):
                 continue
             project = Project(**project_dict)
             projects.named_set(project)
+        return files
@@ -0,0 +1,101 @@
+""" Buildbot inplace config
+(C) Copyright 2015 HicknHack Software GmbH
+
+The original code can be found at:
+https://github.com/hicknhack-software/buildbot-inplace-config
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from twisted.internet import defer, reactor
+from twisted.python import log
+from delta import ConfigDelta
+from metrics import metrics
+
+
+class ReconfigQueue(object):
+    """ Collects the project registrations of concurrent builds during a short window
+        and applies them to the master with a single reconfiguration. """
+
+    def __init__(self, config, debounce):
+        self.config = config
+        self.debounce = debounce
+        self._pending = []
+        self._master = None
+        self._timer = None
+        self._unapplied = ConfigDelta()  # removals of a failed reconfiguration
+        self._lock = defer.DeferredLock()
+
+    def register(self, master, project):
+        return self.update(master, lambda: self.config.setup_project_inplace(project))
+
+    def reset(self, master, project, snapshot_id):
+        return self.update(master, lambda: self.config.reset_project_inplace(project, snapshot_id))
+
+    def update(self, master, compute_delta):
+        """ Queues compute_delta, a callable that changes the config and returns the ConfigDelta """
+        d = defer.Deferred()
+        self._pending.append((compute_delta, d))
+        self._master = master
+        if self._timer is None:
+            self._timer = reactor.callLater(self.debounce, self._flush)
+        return d
+
+    @defer.inlineCallbacks
+    def _flush(self):
+        self._timer = None
+        pending, self._pending = self._pending, []
+        master = self._master
+        yield self._lock.acquire()
+        waiting = []  # deferreds whose compute_delta succeeded
+        delta, self._unapplied = self._unapplied, ConfigDelta()
+        try:
+            if self.config.master_config is not None and master.config is not self.config.master_config:
+                self.config.forget_project_builders()  # master.cfg was reloaded meanwhile
+                delta = ConfigDelta()
+            for compute_delta, d in pending:
+                try:
+                    delta.update(compute_delta())
+                except Exception as e:
+                    self.config.invalidate_registrations()
+                    d.errback(e)
+                    continue
+                waiting.append(d)
+            if delta:
+                log.msg("Reconfiguring for %d requests with %d changes" % (len(pending), len(delta)),
+                        system='Inplace Config')
+                metrics.count('reconfig_requests', len(pending))
+                metrics.count('reconfig_builders_added', len(delta.builders))
+                metrics.count('reconfig_builders_removed', len(delta.removed_builders))
+                with metrics.timer('reconfig'):
+                    yield self._apply(master, delta)
+            delta.applied()
+        except Exception as e:
+            # the config already counts the builders of delta as registered, send them again next time
+            self.config.invalidate_registrations()
+            self._unapplied = delta.removals()
+            for _, d in pending:
+                if not d.called:
+                    d.errback(e)
+        else:
+            for d in waiting:
+                d.callback(delta)
+        finally:
+            self._lock.release()
+
+    def _apply(self, master, delta):
+        master_config = delta.apply(master.config)
+        master.config = master_config
+        self.config.master_config = master_config
+        for svc in master.workers.services:
+            svc.configured = False
+        return master.reconfigServiceWithBuildbotConfig(master_config)
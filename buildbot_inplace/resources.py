@@ -0,0 +1,60 @@
+""" Buildbot inplace config
+(C) Copyright 2015 HicknHack Software GmbH
+
+The original code can be found at:
+https://github.com/hicknhack-software/buildbot-inplace-config
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+class ResourceTracker(object):
+    """ Packs profile builds onto workers by the capacity from the worker YAML and the cost of the profiles """
+
+    def __init__(self, config):
+        self.config = config
+        self._costs = {}  # builder name -> (cores, memory)
+
+    def set_cost(self, builder_name, profile):
+        self._costs[builder_name] = (profile.cost_cores, profile.cost_memory)
+
+    def remove(self, builder_name):
+        self._costs.pop(builder_name, None)
+
+    def fitting_workers(self, profile, worker_names):
+        """ worker_names without the workers that are too small for a build of profile even when idle """
+        result = []
+        for name in worker_names:
+            inplace_worker = self.config.inplace_workers.named_get(name)
+            if inplace_worker is None or (_fits(profile.cost_cores, inplace_worker.cores) and
+                                          _fits(profile.cost_memory, inplace_worker.memory)):
+                result.append(name)
+        return result
+
+    def can_start_build(self, builder, worker_for_builder, buildrequest):
+        """ canStartBuild for BuilderConfig """
+        worker = worker_for_builder.worker
+        inplace_worker = self.config.inplace_workers.named_get(worker.workername)
+        if inplace_worker is None:
+            return True
+        cores, memory = self._costs.get(builder.name, (0, 0))
+        for wfb in worker.workerforbuilders.values():
+            if wfb.isBusy():
+                used_cores, used_memory = self._costs.get(wfb.builder_name, (0, 0))
+                cores += used_cores
+                memory += used_memory
+        return _fits(cores, inplace_worker.cores) and _fits(memory, inplace_worker.memory)
+
+
+def _fits(needed, capacity):
+    return capacity is None or needed <= capacity
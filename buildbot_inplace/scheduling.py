@@ -0,0 +1,105 @@
+""" Buildbot inplace config
+(C) Copyright 2015 HicknHack Software GmbH
+
+The original code can be found at:
+https://github.com/hicknhack-software/buildbot-inplace-config
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from twisted.internet import defer
+from buildbot.status.builder import SUCCESS, WARNINGS
+
+
+class BuildDurations(object):
+    """ Average durations of the recent successful builds per builder and per (builder, worker).
+        Values are refreshed from the master database before builds are triggered. """
+
+    HISTORY = 10
+
+    def __init__(self):
+        self._builders = {}  # builder name -> seconds
+        self._workers = {}  # (builder name, worker name) -> seconds
+        self._worker_names = {}  # workerid -> worker name
+
+    def expected(self, builder_name):
+        return self._builders.get(builder_name)
+
+    def expected_on(self, builder_name, worker_name):
+        return self._workers.get((builder_name, worker_name))
+
+    def longest_first(self, builder_name):
+        """ Sort key, unknown builders come first as they might be the longest """
+        return -self._builders.get(builder_name, float('inf'))
+
+    @defer.inlineCallbacks
+    def refresh(self, master, builder_names):
+        for builder_name in builder_names:
+            builderid = yield master.db.builders.findBuilderId(builder_name)
+            builds = yield master.data.get(('builders', builderid, 'builds'),
+                                           order=['-number'], limit=self.HISTORY)
+            durations = {}
+            for build in builds:
+                if build['results'] not in (SUCCESS, WARNINGS) or not build['complete_at']:
+                    continue
+                worker_name = yield self._worker_name(master, build['workerid'])
+                seconds = _seconds(build['complete_at'] - build['started_at'])
+                durations.setdefault(worker_name, []).append(seconds)
+            all_durations = sum(durations.values(), [])
+            if all_durations:
+                self._builders[builder_name] = _average(all_durations)
+            for worker_name, seconds in durations.items():
+                self._workers[(builder_name, worker_name)] = _average(seconds)
+
+    @defer.inlineCallbacks
+    def _worker_name(self, master, workerid):
+        if workerid not in self._worker_names:
+            worker = yield master.data.get(('workers', workerid))
+            self._worker_names[workerid] = worker['name'] if worker else None
+        defer.returnValue(self._worker_names[workerid])
+
+    def next_worker(self, builder, workers, buildrequest):
+        """ nextWorker for BuilderConfig: prefers idle workers, then workers that built this builder before
+            (warm checkout), then the fastest of them """
+        def score(worker_for_builder):
+            worker = worker_for_builder.worker
+            busy = len([wfb for wfb in worker.workerforbuilders.values() if wfb.isBusy()])
+            expected = self.expected_on(builder.name, worker.workername)
+            return busy, expected is None, expected
+        return min(workers, key=score) if workers else None
+
+
+def _seconds(delta):
+    return delta.days * 86400 + delta.seconds + delta.microseconds / 1e6
+
+
+def _average(values):
+    return sum(values) / float(len(values))
+
+
+@defer.inlineCallbacks
+def collapse_profile_requests(master, builder, req1, req2):
+    """ collapseRequests for profile builders. Requests for the same project, repository and branch
+        are collapsed whatever their revision, the remaining request builds the newest one. """
+    if req1['buildsetid'] == req2['buildsetid']:
+        defer.returnValue(True)
+    buildsets = yield defer.gatherResults([master.data.get(('buildsets', req['buildsetid'])) for req in (req1, req2)])
+    sources = [dict((ss['codebase'], ss) for ss in buildset['sourcestamps']) for buildset in buildsets]
+    if set(sources[0]) != set(sources[1]):
+        defer.returnValue(False)
+    for codebase, ss in sources[0].items():
+        other = sources[1][codebase]
+        if ss['patch'] or other['patch']:
+            defer.returnValue(False)
+        if any(ss[key] != other[key] for key in ('project', 'repository', 'branch')):
+            defer.returnValue(False)
+    defer.returnValue(True)
@@ -16,29 +16,129 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+from collections import OrderedDict
 from buildbot.process.factory import BuildFactory
 from buildbot.steps.shell import ShellCommand
 from buildbot.steps.shellsequence import ShellSequence
-from steps.checkout import create_checkout_step
-from steps.setup import SetupStep
+from snapshots import SNAPSHOT_PROPERTY
+from steps.changes import CHANGED_FILES_PROPERTY
+from steps.checkout import create_checkout_step, create_reference_step
+from steps.parallel import ParallelShellStep
+from steps.result_cache import ResultCacheCheckStep, ResultCacheStoreStep, is_cache_hit
+from steps.setup import SetupStep, rendered_build_env
 
 
 class SetupBuildFactory(BuildFactory):
     """A Factory that creates environment-aware build steps from a configuration."""
 
-    def __init__(self, config, project, profile):
+    def __init__(self, config, project, profile, inplace):
         BuildFactory.__init__(self, [])
-        env = {}
+        env = rendered_build_env  # the steps are shared between builds, each build collects its own environment
 
-        for setup in profile.setups:
-            desc = "Preparing %s" % setup
+        if config.batch_setups and profile.setups:
+            desc = "Preparing %s" % ", ".join(profile.setups)
             prepare_dict = dict(name=desc, description=desc, descriptionDone=desc)
-            self.addStep(SetupStep(setup, config=config, env=env, **prepare_dict))
-        self.addStep(create_checkout_step(project))
-        profile_commands = project.inplace.profile_commands(profile)
-        for pc in profile_commands:
-            shell_dict = dict(name=pc.name, description=pc.name, descriptionDone=pc.name)
+            self.addStep(SetupStep(profile.setups, config=config,
+                                   stage_diffs=config.setup_stage_diffs, **prepare_dict))
+        else:
+            for setup in profile.setups:
+                desc = "Preparing %s" % setup
+                prepare_dict = dict(name=desc, description=desc, descriptionDone=desc)
+                self.addStep(SetupStep(setup, config=config, **prepare_dict))
+        reference_step = create_reference_step(project, config.inplace_workers)
+        if reference_step:
+            self.addStep(reference_step)
+        self.addStep(create_checkout_step(project, config.inplace_workers))
+        if config.result_cache:
+            self.addStep(ResultCacheCheckStep(profile, inplace, config.result_cache_size))
+        for stage in inplace.profile_stages(profile):
+            if len(stage) > 1:
+                desc = " + ".join(pc.name for pc in stage)
+                shell_dict = dict(name=desc, description=desc, descriptionDone=desc, doStepIf=_not_cached)
+                self.addStep(ParallelShellStep(stage, env=env, **shell_dict))
+                continue
+            pc = stage[0]
+            shell_dict = dict(name=pc.name, description=pc.name, descriptionDone=pc.name, doStepIf=_not_cached)
+            if pc.has_path_filter:
+                shell_dict['doStepIf'] = _matches_changed_files(pc)
             if len(pc.commands) == 1:
                 self.addStep(ShellCommand(command=pc.commands[0], env=env, **shell_dict))
             else:
                 self.addStep(ShellSequence(pc.commands, env=env, **shell_dict))
+        if config.result_cache:
+            self.addStep(ResultCacheStoreStep(config.result_cache_size))
+
+
+def _not_cached(step):
+    return not is_cache_hit(step)
+
+
+def _matches_changed_files(profile_command):
+    return lambda step: _not_cached(step) and profile_command.matches(step.getProperty(CHANGED_FILES_PROPERTY))
+
+
+class FactoryCache(object):
+    """ LRU cache of materialized step lists. The least recently built ones are dropped first. """
+
+    def __init__(self, size=64):
+        self.size = size
+        self._steps = OrderedDict()
+
+    def steps(self, key, create_steps):
+        steps = self._steps.pop(key, None)
+        if steps is None:
+            steps = create_steps()
+        self._steps[key] = steps
+        while len(self._steps) > self.size:
+            self._steps.popitem(last=False)
+        return steps
+
+    def forget(self, builder_name):
+        """ Drops the step lists of builder_name """
+        for key in [key for key in self._steps if key[0] == builder_name]:
+            del self._steps[key]
+
+
+class SnapshotBuildFactory(BuildFactory):
+    """A Factory for the builds of one profile. The steps are created from the inplace config snapshot
+    of the triggering build when the build starts, so builds of different snapshots can run at once.
+    Concurrent builds of the same snapshot share the step list, state of a build is kept on the build."""
+
+    def __init__(self, config, project, builder_name, profile_key):
+        BuildFactory.__init__(self, [])
+        self.config = config
+        self.project = project
+        self.builder_name = builder_name
+        self.profile_key = profile_key  # (platform, name)
+
+    def snapshot(self, properties):
+        """ (snapshot id, inplace config, profile) for a build request, the latest snapshot if it has none """
+        snapshots = self.config.snapshots
+        snapshot_id = properties.getProperty(SNAPSHOT_PROPERTY)
+        inplace = snapshots.get(self.project.name, snapshot_id)
+        if inplace is None:
+            versions = snapshots.versions(self.project.name)
+            if not versions:
+                raise Exception("No inplace config snapshot for project '%s'" % self.project.name)
+            snapshot_id = versions[-1]
+            inplace = snapshots.get(self.project.name, snapshot_id)
+        return snapshot_id, inplace, self._profile(inplace)
+
+    def _profile(self, inplace):
+        for profile in inplace.profiles:
+            if (profile.platform, profile.name) == self.profile_key:
+                return profile
+
+    def steps_for(self, snapshot_id, inplace, profile):
+        if profile is None:
+            return []  # profile was removed in this snapshot
+        return self.config.factory_cache.steps(
+            (self.builder_name, snapshot_id),
+            lambda: SetupBuildFactory(self.config, self.project, profile, inplace).steps)
+
+    def newBuild(self, requests):
+        build = self.buildClass(requests)
+        build.useProgress = self.useProgress
+        build.workdir = self.workdir
+        build.setStepFactories(self.steps_for(*self.snapshot(requests[0].properties)))
+        return build
@@ -0,0 +1,84 @@
+""" Buildbot inplace config
+(C) Copyright 2015 HicknHack Software GmbH
+
+The original code can be found at:
+https://github.com/hicknhack-software/buildbot-inplace-config
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from collections import OrderedDict
+
+SNAPSHOT_PROPERTY = 'inplace_snapshot'
+
+
+class SnapshotStore(object):
+    """ The inplace configs of running project builds, keyed by project and git blob id of the .buildbot.yml.
+        Snapshots are never changed and are kept while builds refer to them. """
+
+    def __init__(self):
+        self._snapshots = {}  # project name -> OrderedDict(snapshot id -> [inplace config, references])
+        self._pinned = {}  # project name -> snapshot id
+
+    def acquire(self, project_name, snapshot_id, inplace_config):
+        snapshots = self._snapshots.setdefault(project_name, OrderedDict())
+        entry = snapshots.pop(snapshot_id, None) or [inplace_config, 0]
+        entry[1] += 1
+        snapshots[snapshot_id] = entry  # latest last
+
+    def release(self, project_name, snapshot_id):
+        snapshots = self._snapshots.get(project_name, {})
+        entry = snapshots.get(snapshot_id)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del snapshots[snapshot_id]
+        if not snapshots:
+            self._snapshots.pop(project_name, None)
+
+    def pin(self, project_name, snapshot_id, inplace_config):
+        """ Keeps one reference to the snapshot after all builds released it. Replaces an older pin. """
+        pinned = self._pinned.get(project_name)
+        if pinned == snapshot_id:
+            return
+        self.acquire(project_name, snapshot_id, inplace_config)
+        self._pinned[project_name] = snapshot_id
+        if pinned is not None:
+            self.release(project_name, pinned)
+
+    def unpin(self, project_name):
+        pinned = self._pinned.pop(project_name, None)
+        if pinned is not None:
+            self.release(project_name, pinned)
+
+    def pinned(self, project_name):
+        return self._pinned.get(project_name)
+
+    def forget(self, project_name):
+        self._snapshots.pop(project_name, None)
+        self._pinned.pop(project_name, None)
+
+    def get(self, project_name, snapshot_id):
+        entry = self._snapshots.get(project_name, {}).get(snapshot_id)
+        return entry[0] if entry is not None else None
+
+    def latest(self, project_name):
+        snapshots = self._snapshots.get(project_name)
+        return next(reversed(snapshots.values()))[0] if snapshots else None
+
+    def versions(self, project_name):
+        return tuple(self._snapshots.get(project_name, {}))
+
+    def configs(self, project_name):
+        """ (snapshot id, inplace config) of all active snapshots, the latest last """
+        return [(snapshot_id, entry[0]) for snapshot_id, entry in self._snapshots.get(project_name, {}).items()]
@@ -0,0 +1,85 @@
+""" Buildbot inplace config
+(C) Copyright 2015 HicknHack Software GmbH
+
+The original code can be found at:
+https://github.com/hicknhack-software/buildbot-inplace-config
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from twisted.internet import defer
+from buildbot.process.buildstep import BuildStep, ShellMixin
+from buildbot.status.builder import SUCCESS
+from ..metrics import TimedStepMixin
+from ..snapshots import SNAPSHOT_PROPERTY
+from .success import ShowStepIfSuccessful
+
+CHANGED_FILES_PROPERTY = 'inplace_changed_files'
+STATE_CLASS = 'buildbot_inplace.Project'
+
+
+@defer.inlineCallbacks
+def get_last_good_revision(master, project, branch):
+    objectid = yield master.db.state.getObjectId(project.name, STATE_CLASS)
+    revision = yield master.db.state.getState(objectid, 'last_good_revision_%s' % (branch or ''), None)
+    defer.returnValue(revision)
+
+
+@defer.inlineCallbacks
+def set_last_good_revision(master, project, branch, revision):
+    objectid = yield master.db.state.getObjectId(project.name, STATE_CLASS)
+    yield master.db.state.setState(objectid, 'last_good_revision_%s' % (branch or ''), revision)
+
+
+class AnalyzeChangesStep(TimedStepMixin, ShellMixin, BuildStep):
+    """ Sets the files changed since the last successful build of the branch as a property.
+        The property is None if the changes are unknown, then all profiles are built. """
+
+    NAME = "Analyze Changes"
+    metric_phase = "analyze_changes"
+    LOG_NAME = "changes"
+
+    def __init__(self, project, snapshots, mirror=None, **kwargs):
+        self.project = project
+        self.snapshots = snapshots
+        self.mirror = mirror
+        kwargs = self.setupShellMixin(kwargs, prohibitArgs=['command'])
+        BuildStep.__init__(self, name=self.NAME, hideStepIf=ShowStepIfSuccessful, **kwargs)
+
+    @defer.inlineCallbacks
+    def run(self):
+        changed_files = None
+        inplace = self.snapshots.get(self.project.name, self.getProperty(SNAPSHOT_PROPERTY))
+        if inplace is not None and inplace.has_path_filters:
+            changed_files = yield self._changed_files()
+        self.setProperty(CHANGED_FILES_PROPERTY, changed_files, self.NAME)
+        defer.returnValue(SUCCESS)
+
+    @defer.inlineCallbacks
+    def _changed_files(self):
+        revision = self.getProperty('got_revision')
+        previous = yield get_last_good_revision(self.master, self.project, self.getProperty('branch'))
+        if not revision or not previous or previous == revision:
+            defer.returnValue(None)
+        if self.mirror:
+            try:
+                output = yield self.mirror.changed_files(self.project, previous, revision)
+            except Exception:
+                defer.returnValue(None)
+        else:
+            cmd = yield self.makeRemoteShellCommand(command=['git', 'diff', '--name-only', previous, revision],
+                                                    collectStdout=True, stdioLogName=self.LOG_NAME)
+            yield self.runCommand(cmd)
+            if cmd.didFail():
+                defer.returnValue(None)
+            output = cmd.stdout
+        defer.returnValue([line for line in output.splitlines() if line])
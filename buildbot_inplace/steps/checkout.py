@@ -17,7 +17,13 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 from urlparse import urlparse, urlunparse
+from twisted.internet import defer
+from buildbot.locks import WorkerLock
+from buildbot.process.buildstep import BuildStep, ShellMixin
+from buildbot.process.properties import renderer
+from buildbot.status.builder import SUCCESS
 from buildbot.steps.source.git import Git
+from ..metrics import TimedStepMixin
 from .success import ShowStepIfSuccessful
 
 
@@ -28,17 +34,105 @@ def set_url_auth(git_url, user, password):
     return urlunparse((scheme, netloc, url, params, query, fragment))
 
 
-def create_checkout_step(project):
+def reference_repo_dir(worker, project):
+    if worker is None or not worker.reference_dir:
+        return None
+    return worker.reference_dir + project.name + '.git'
+
+
+def _reference_renderer(workers, project):
+    @renderer
+    def reference(props):
+        return reference_repo_dir(workers.named_get(props.getProperty('workername')), project)
+    return reference
+
+
+class TimedGit(TimedStepMixin, Git):
+    metric_phase = 'checkout'
+
+    def __init__(self, project, **kwargs):
+        self.project = project
+        Git.__init__(self, **kwargs)
+
+
+class UpdateReferenceStep(TimedStepMixin, ShellMixin, BuildStep):
+    """ Keeps a bare mirror of the project in the reference directory of the worker up to date.
+    Checkouts borrow its objects, so all builders of a project on one worker share them. """
+
+    metric_phase = 'update_reference'
+    # checkouts point at the objects of the mirror, a gc must never drop them
+    GIT_CONFIG = ['-c', 'gc.auto=0', '-c', 'gc.pruneExpire=never']
+
+    def __init__(self, project, workers, **kwargs):
+        self.project = project
+        self.workers = workers
+        kwargs.setdefault('doStepIf', self._has_reference)
+        kwargs.setdefault('hideStepIf', ShowStepIfSuccessful)
+        kwargs = self.setupShellMixin(kwargs, prohibitArgs=['command'])
+        BuildStep.__init__(self, **kwargs)
+
+    def _reference_dir(self):
+        return reference_repo_dir(self.workers.named_get(self.getWorkerName()), self.project)
+
+    def _has_reference(self, step):
+        return self._reference_dir() is not None
+
+    @defer.inlineCallbacks
+    def run(self):
+        reference_dir = self._reference_dir()
+        repo_url = set_url_auth(self.project.repo_url, self.project.repo_user, self.project.repo_password)
+        cmd = yield self.makeRemoteShellCommand(command=['git'] + self.GIT_CONFIG + [
+            '--git-dir', reference_dir, 'fetch', '--prune', repo_url, '+refs/*:refs/*'])
+        yield self.runCommand(cmd)
+        if not cmd.didFail():
+            defer.returnValue(SUCCESS)
+        cmd = yield self.makeRemoteShellCommand(command=['git', 'clone', '--mirror'] + self.GIT_CONFIG +
+                                                [repo_url, reference_dir])  # clone stores the settings
+        yield self.runCommand(cmd)
+        defer.returnValue(cmd.results())
+
+
+_reference_locks = {}
+
+
+def _reference_lock(project):
+    """ one fetch per reference repository and worker at a time """
+    if project.name not in _reference_locks:
+        _reference_locks[project.name] = WorkerLock("%s_Reference" % project.name)
+    return _reference_locks[project.name]
+
+
+def create_reference_step(project, workers):
+    """ returns None if no worker declares a reference directory """
+    if project.repo_type != "git" or not any(worker.reference_dir for worker in workers):
+        return None
+    description = 'Update Reference'
+    return UpdateReferenceStep(project, workers,
+                               name=description,
+                               description=description,
+                               descriptionDone=description,
+                               locks=[_reference_lock(project).access('exclusive')],
+                               haltOnFailure=True)
+
+
+def create_checkout_step(project, workers=None):
     description = 'Checkout'
 
     repo_type = project.repo_type
     if repo_type == "git":
-        return Git(repourl=set_url_auth(project.repo_url, project.repo_user, project.repo_password),
-                   mode='incremental',
-                   submodules=True,
-                   name=description,
-                   description=description,
-                   descriptionDone=description,
-                   hideStepIf=ShowStepIfSuccessful)
+        git_kwargs = {}
+        if workers is not None and any(worker.reference_dir for worker in workers):
+            git_kwargs['reference'] = _reference_renderer(workers, project)
+        if project.shallow:
+            git_kwargs['shallow'] = project.shallow
+        return TimedGit(project,
+                        repourl=set_url_auth(project.repo_url, project.repo_user, project.repo_password),
+                        mode='incremental',
+                        submodules=True,
+                        name=description,
+                        description=description,
+                        descriptionDone=description,
+                        hideStepIf=ShowStepIfSuccessful,
+                        **git_kwargs)
     else:
         raise Exception("Repository type '" + str(repo_type) + "' not supported.")
@@ -0,0 +1,64 @@
+""" Buildbot inplace config
+(C) Copyright 2015 HicknHack Software GmbH
+
+The original code can be found at:
+https://github.com/hicknhack-software/buildbot-inplace-config
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from twisted.internet import defer
+from buildbot.process.buildstep import BuildStep, ShellMixin
+from buildbot.status.builder import SKIPPED, SUCCESS, worst_status
+from .changes import CHANGED_FILES_PROPERTY
+
+
+class ParallelShellStep(ShellMixin, BuildStep):
+    """A Step that runs the command sequences of several actions at the same time on the worker."""
+
+    def __init__(self, profile_commands, **kwargs):
+        self.profile_commands = profile_commands
+        self._running = []
+        kwargs = self.setupShellMixin(kwargs, prohibitArgs=['command'])
+        BuildStep.__init__(self, **kwargs)
+
+    @defer.inlineCallbacks
+    def run(self):
+        changed_files = self.getProperty(CHANGED_FILES_PROPERTY)
+        profile_commands = [pc for pc in self.profile_commands if pc.matches(changed_files)]
+        if not profile_commands:
+            defer.returnValue(SKIPPED)
+        results = yield defer.gatherResults([self._run_commands(pc) for pc in profile_commands],
+                                            consumeErrors=True)
+        defer.returnValue(reduce(worst_status, results, SUCCESS))
+
+    @defer.inlineCallbacks
+    def _run_commands(self, profile_command):
+        results = SUCCESS
+        for index, command in enumerate(profile_command.commands):
+            log_name = profile_command.name if index == 0 else "%s (%d)" % (profile_command.name, index + 1)
+            cmd = yield self.makeRemoteShellCommand(command=command, stdioLogName=log_name)
+            self._running.append(cmd)
+            try:
+                yield self.runCommand(cmd)
+            finally:
+                self._running.remove(cmd)
+            results = worst_status(results, cmd.results())
+            if cmd.didFail():
+                break
+        defer.returnValue(results)
+
+    @defer.inlineCallbacks
+    def interrupt(self, reason):
+        for cmd in list(self._running):
+            yield cmd.interrupt(reason)
+        yield BuildStep.interrupt(self, reason)
@@ -16,9 +16,12 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+from twisted.internet import defer
 from buildbot.config import MasterConfig
-from buildbot.status.builder import FAILURE
-from buildbot.steps.master import MasterShellCommand
+from buildbot.process.buildstep import BuildStep
+from buildbot.status.builder import FAILURE, SUCCESS
+from ..metrics import TimedStepMixin
+from ..snapshots import SNAPSHOT_PROPERTY
 from .success import ShowStepIfSuccessful
 
 class ProfileNotFulfilledException(Exception):
@@ -55,34 +58,32 @@ def create_master_config(config_dict):
     return master_config
 
 
-class ReconfigBuildmasterStep(MasterShellCommand):
-    """ A Step that reconfigures the Buildmaster."""
-
-    COMMAND = ["echo", "Reconfigured Master"]
+class ReconfigBuildmasterStep(TimedStepMixin, BuildStep):
+    """ A Step that reconfigures the Buildmaster.
+        Concurrent steps are batched by the reconfig queue of the config. """
 
     def __init__(self, config, project, update_from_project, **kwargs):
         self.config = config
         self.project = project
         self.from_project = update_from_project
-        MasterShellCommand.__init__(self,
-                                    command=self.COMMAND,
-                                    hideStepIf=ShowStepIfSuccessful,
-                                    **kwargs)
+        BuildStep.__init__(self,
+                           hideStepIf=ShowStepIfSuccessful,
+                           **kwargs)
+
+    @property
+    def metric_phase(self):
+        return 'register' if self.from_project else 'reset'
 
-    def start(self):
+    @defer.inlineCallbacks
+    def run(self):
+        queue = self.config.reconfig_queue
         try:
-            self.config.setup_project_inplace(self.project)
+            if self.from_project:
+                delta = yield queue.register(self.master, self.project)
+            else:
+                delta = yield queue.reset(self.master, self.project, self.getProperty(SNAPSHOT_PROPERTY))
         except ProfileNotFulfilledException as e:
-            self.addCompleteLog("errorlog", "Failing: %s" % str(e))
-            return FAILURE
-
-        if self.from_project:
-            master_config = create_master_config(self.config)
-            self.master.config = master_config
-            for svc in self.master.workers.services:
-                svc.configured = False
-            self.master.reconfigServiceWithBuildbotConfig(master_config)
-        else:
-            self.master.reconfig()
-
-        return MasterShellCommand.start(self)
+            yield self.addCompleteLog("errorlog", "Failing: %s" % str(e))
+            defer.returnValue(FAILURE)
+        yield self.addCompleteLog("reconfig", "Reconfigured Master (%d changes in batch)" % len(delta))
+        defer.returnValue(SUCCESS)
@@ -0,0 +1,106 @@
+""" Buildbot inplace config
+(C) Copyright 2015 HicknHack Software GmbH
+
+The original code can be found at:
+https://github.com/hicknhack-software/buildbot-inplace-config
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from hashlib import sha1
+from twisted.internet import defer
+from buildbot.process.buildstep import BuildStep, ShellMixin
+from buildbot.status.builder import SUCCESS, WARNINGS
+from .changes import CHANGED_FILES_PROPERTY
+from .setup import build_env
+
+CACHE_HIT_PROPERTY = 'inplace_result_cache_hit'
+CACHE_KEY_PROPERTY = 'inplace_result_cache_key'
+CACHE_BYPASS_PROPERTY = 'inplace_result_cache_bypass'  # set to build and store the outcome anyway
+STATE_NAME = 'results'
+STATE_CLASS = 'buildbot_inplace.ResultCache'
+CACHEABLE_RESULTS = (SUCCESS, WARNINGS)  # failures might be flaky, they are always built again
+
+
+def is_cache_hit(step):
+    return bool(step.getProperty(CACHE_HIT_PROPERTY))
+
+
+def _state_object_id(master):
+    return master.db.state.getObjectId(STATE_NAME, STATE_CLASS)
+
+
+def _slot_name(key, size):
+    """ Each key is stored in one of size slots, so the number of stored outcomes is bounded """
+    return "slot_%d" % (int(key, 16) % size)
+
+
+class ResultCacheCheckStep(ShellMixin, BuildStep):
+    """ Looks up the outcome of a previous build of the same tree, profile, actions and environment.
+        On a hit the step finishes with the cached result and the following steps are skipped. """
+
+    NAME = "Check Result Cache"
+
+    def __init__(self, profile, inplace, size, **kwargs):
+        self.profile = profile
+        self.inplace = inplace
+        self.size = size
+        kwargs = self.setupShellMixin(kwargs, prohibitArgs=['command'])
+        BuildStep.__init__(self, name=self.NAME, **kwargs)
+
+    @defer.inlineCallbacks
+    def run(self):
+        cmd = yield self.makeRemoteShellCommand(command=['git', 'rev-parse', 'HEAD^{tree}'],
+                                                collectStdout=True, stdioLogName="tree")
+        yield self.runCommand(cmd)
+        if cmd.didFail():
+            defer.returnValue(SUCCESS)  # not cacheable
+        key = self._cache_key(cmd.stdout.strip())
+        cached = None
+        if not self.getProperty(CACHE_BYPASS_PROPERTY):
+            objectid = yield _state_object_id(self.master)
+            cached = yield self.master.db.state.getState(objectid, _slot_name(key, self.size), None)
+        if cached is None or cached.get('key') != key:
+            self.setProperty(CACHE_KEY_PROPERTY, key, self.NAME)
+            defer.returnValue(SUCCESS)
+        self.setProperty(CACHE_HIT_PROPERTY, True, self.NAME)
+        yield self.addURL("cached build", cached['url'])
+        defer.returnValue(cached['results'])
+
+    def _cache_key(self, tree_hash):
+        changed_files = self.getProperty(CHANGED_FILES_PROPERTY)
+        commands = [(pc.name, pc.commands) for pc in self.inplace.profile_commands(self.profile)
+                    if pc.matches(changed_files)]  # actions skipped by path filters make a different build
+        env_fingerprint = sha1(repr(sorted(build_env(self.build).items()))).hexdigest()
+        return sha1(repr((tree_hash, self.profile.key, commands, env_fingerprint))).hexdigest()
+
+
+class ResultCacheStoreStep(BuildStep):
+    """ Stores the outcome of the build for the key found by ResultCacheCheckStep """
+
+    NAME = "Store Result"
+
+    def __init__(self, size, **kwargs):
+        self.size = size
+        BuildStep.__init__(self, name=self.NAME, alwaysRun=True, hideStepIf=True, **kwargs)
+
+    @defer.inlineCallbacks
+    def run(self):
+        key = self.getProperty(CACHE_KEY_PROPERTY)
+        results = self.build.results
+        if key and not is_cache_hit(self) and results in CACHEABLE_RESULTS:
+            builderid = yield self.build.builder.getBuilderId()
+            url = "%s#builders/%d/builds/%d" % (self.master.config.buildbotURL, builderid, self.build.number)
+            objectid = yield _state_object_id(self.master)
+            yield self.master.db.state.setState(objectid, _slot_name(key, self.size),
+                                                dict(key=key, results=results, url=url))
+        defer.returnValue(SUCCESS)
@@ -19,18 +19,24 @@ limitations under the License.
 from twisted.internet import defer
 from buildbot.process.buildstep import BuildStep, ShellMixin, BuildStepFailed
 from buildbot.process.logobserver import LineConsumerLogObserver
-from ..inplace_config import InplaceConfig
+from buildbot.status.builder import FAILURE, SUCCESS
+from ..inplace_config import InplaceConfig, blob_id
+from ..metrics import TimedStepMixin
+from ..snapshots import SNAPSHOT_PROPERTY
 from .success import ShowStepIfSuccessful
 
 
-class RetrieveInplaceConfigStep(ShellMixin, BuildStep):
+class RetrieveInplaceConfigStep(TimedStepMixin, ShellMixin, BuildStep):
     NAME = "Retrieve Inplace Config"
+    metric_phase = "retrieve_config"
     COMMAND = ["cat", ".buildbot.yml"]
     LOG_NAME = "inplace"
 
-    def __init__(self, project, **kwargs):
+    def __init__(self, project, cache, snapshots, **kwargs):
         self.inplace_lines = None
         self.project = project
+        self.cache = cache
+        self.snapshots = snapshots
         kwargs = self.setupShellMixin(kwargs, prohibitArgs=['command'])
         BuildStep.__init__(self,
                            name=self.NAME,
@@ -44,13 +50,64 @@ class RetrieveInplaceConfigStep(ShellMixin, BuildStep):
         yield self.runCommand(cmd)
         if cmd.didFail():
             BuildStepFailed()
-        inplace_config = InplaceConfig.from_text('\n'.join(self.inplace_lines))
+        hits = self.cache.hits
+        inplace_text = '\n'.join(self.inplace_lines)
+        snapshot_id = blob_id(inplace_text)
+        inplace_config = self.cache.from_text(inplace_text, snapshot_id)
         # inplace_config.check(self)
-        self.project.inplace = inplace_config
-        yield defer.returnValue(cmd.results())
+        self.setProperty('inplace_config_cached', self.cache.hits > hits, self.NAME)
+        results = yield acquire_snapshot(self, self.snapshots, snapshot_id, inplace_config)
+        defer.returnValue(results)
 
     def _consume_log(self):
         while True:
             stream, line = yield
             if stream == 'o':
                 self.inplace_lines.append(line)
+
+
+class RetrieveMirroredInplaceConfigStep(TimedStepMixin, BuildStep):
+    """ Reads the inplace config from the master-side mirror of the project """
+    NAME = RetrieveInplaceConfigStep.NAME
+    metric_phase = RetrieveInplaceConfigStep.metric_phase
+    FILE_NAME = ".buildbot.yml"
+    LOG_NAME = RetrieveInplaceConfigStep.LOG_NAME
+
+    def __init__(self, project, mirror, cache, snapshots, **kwargs):
+        self.project = project
+        self.mirror = mirror
+        self.cache = cache
+        self.snapshots = snapshots
+        BuildStep.__init__(self,
+                           name=self.NAME,
+                           hideStepIf=ShowStepIfSuccessful, **kwargs)
+
+    @defer.inlineCallbacks
+    def run(self):
+        yield self.mirror.update(self.project)
+        rev = self.getProperty('revision') or self.getProperty('branch') or 'HEAD'
+        revision = yield self.mirror.rev_parse(self.project, rev)
+        self.setProperty('got_revision', revision, self.NAME)
+        blob_id = yield self.mirror.blob_id(self.project, revision, self.FILE_NAME)
+        inplace_config = self.cache.get(blob_id)
+        self.setProperty('inplace_config_cached', inplace_config is not None, self.NAME)
+        if inplace_config is None:
+            inplace_text = yield self.mirror.show(self.project, revision, self.FILE_NAME)
+            yield self.addCompleteLog(self.LOG_NAME, inplace_text)
+            inplace_config = InplaceConfig.from_text(inplace_text)
+            if inplace_config is not None:
+                self.cache.put(blob_id, inplace_config)
+        results = yield acquire_snapshot(self, self.snapshots, blob_id, inplace_config)
+        defer.returnValue(results)
+
+
+@defer.inlineCallbacks
+def acquire_snapshot(step, snapshots, snapshot_id, inplace_config):
+    """ Keeps inplace_config for the build until its reset step releases it """
+    if inplace_config is None:
+        yield step.addCompleteLog("errorlog", "No profiles and actions found in %s" %
+                                  RetrieveMirroredInplaceConfigStep.FILE_NAME)
+        defer.returnValue(FAILURE)
+    snapshots.acquire(step.project.name, snapshot_id, inplace_config)
+    step.setProperty(SNAPSHOT_PROPERTY, snapshot_id, step.NAME)
+    defer.returnValue(SUCCESS)
@@ -16,25 +16,42 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+from collections import OrderedDict
 from twisted.internet import defer
 from buildbot.process.buildstep import BuildStep, ShellMixin
 from buildbot.process.logobserver import LineConsumerLogObserver
+from buildbot.process.properties import renderer
+from buildbot.status.builder import SUCCESS
+from buildbot.util import flatten
+from ..metrics import metrics
 
 class EnvironmentParser:
-    PATH_LISTS = ['path'] # use lowercase here!
+    PATH_LISTS = ['path', 'ld_library_path', 'dyld_library_path', 'include', 'lib', 'libpath',
+                  'pkg_config_path', 'pythonpath', 'classpath', 'cmake_prefix_path'] # use lowercase here!
 
-    def __init__(self, env_dict, path_delimiter=':'):
+    def __init__(self, env_dict, path_delimiter=':', path_lists=None):
         self.env_dict = env_dict
         self.path_delimiter = path_delimiter
+        self.path_lists = frozenset(key.lower() for key in (path_lists if path_lists is not None else self.PATH_LISTS))
+        self._path_items = {}
 
     def _store(self, key, value):
-        if key.lower() in self.PATH_LISTS:
-            values = self.env_dict[key].split(self.path_delimiter) if key in self.env_dict else []
-            values += [item for item in value.split(self.path_delimiter) if item not in values]
-            self.env_dict[key] = self.path_delimiter.join(values)
+        if key.lower() in self.path_lists:
+            items = self._path_items.get(key)
+            if items is None:
+                items = self._path_items[key] = OrderedDict()
+                if key in self.env_dict:
+                    items.update((item, None) for item in self.env_dict[key].split(self.path_delimiter))
+            for item in value.split(self.path_delimiter):
+                items.setdefault(item, None)
+            self.env_dict[key] = self.path_delimiter.join(items)
         else:
             self.env_dict[key] = value
 
+    def update(self, env):
+        for key, value in env.items():
+            self._store(key, value)
+
     def _parse_line(self, line):
         if '=' in line:
             key, value = line.split('=', 1)
@@ -47,8 +64,93 @@ class EnvironmentParser:
                 self._parse_line(line)
 
 
+def diff_environment(baseline, env):
+    """ Returns the variables of env that differ from baseline """
+    return dict((key, value) for key, value in env.items() if baseline.get(key) != value)
+
+
+class StagedEnvironmentParser:
+    """ Parses an environment dump with one environment per stage marker.
+        The first stage is the baseline environment of the worker.
+        Only lines between a stage marker and the end marker belong to an environment,
+        so the output of the setup scripts is ignored. """
+
+    def __init__(self, marker, end_marker, path_delimiter=':', path_lists=None):
+        self.marker = marker
+        self.end_marker = end_marker
+        self.path_delimiter = path_delimiter
+        self.path_lists = path_lists
+        self.stages = []
+        self._parser = None
+
+    @property
+    def baseline(self):
+        return self.stages[0][1] if self.stages else {}
+
+    @property
+    def env_dict(self):
+        """ The variables of the last stage that differ from the baseline """
+        if len(self.stages) < 2:
+            return {}
+        return diff_environment(self.baseline, self.stages[-1][1])
+
+    def retrieve(self):
+        while True:
+            stream, line = yield
+            if stream != 'o':
+                continue
+            if line.startswith(self.end_marker):
+                self._parser = None
+            elif line.startswith(self.marker):
+                env = {}
+                self.stages.append((line[len(self.marker):].strip(), env))
+                self._parser = EnvironmentParser(env, self.path_delimiter, self.path_lists)
+            elif self._parser:
+                self._parser._parse_line(line)
+
+    def stage_diffs(self):
+        lines = []
+        for (_, before), (name, after) in zip(self.stages, self.stages[1:]):
+            lines.append("%s:" % name)
+            lines.extend("  +%s=%s" % (key, value) for key, value in sorted(diff_environment(before, after).items()))
+            lines.extend("  -%s" % key for key in sorted(before) if key not in after)
+        return '\n'.join(lines)
+
+
+class EnvironmentCache(object):
+    """ Environments captured per (worker, setup) together with the fingerprint of the setup script """
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, key, fingerprint):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != fingerprint:
+            return None
+        return entry[1]
+
+    def put(self, key, fingerprint, env):
+        self._entries[key] = (fingerprint, dict(env))
+
+    def clear(self):
+        self._entries.clear()
+
+
+def build_env(build):
+    """ The environment collected by the setup steps of build. Every build has its own. """
+    if getattr(build, 'inplace_env', None) is None:
+        build.inplace_env = {}
+    return build.inplace_env
+
+
+@renderer
+def rendered_build_env(props):
+    return build_env(props.getBuild())
+
+
 class SetupStep(ShellMixin, BuildStep):
-    """A Step that retrieves the environment after a command."""
+    """A Step that retrieves the environment after a command.
+    All given setups are sourced in a single shell invocation."""
 
     SHELL_CONFIG = {
         "cmd": dict(
@@ -56,6 +158,9 @@ class SetupStep(ShellMixin, BuildStep):
             cmd_delimiter="&",
             start=["cmd", "/c"],
             echo_env="set",
+            echo="echo ",
+            fingerprint='for %%I in (%s) do @echo %%~zI %%~tI',
+            quote='"',
             prefix="",
             suffix=".bat",
         ),
@@ -64,16 +169,22 @@ class SetupStep(ShellMixin, BuildStep):
             cmd_delimiter=";",
             start=["bash", "-c"],
             echo_env="env",
+            echo="echo ",
+            fingerprint="cksum %s",
+            quote="",
             prefix=". ",
             suffix=".sh",
         )
     }
     FALLBACK_SHELL = "bash"
+    STAGE_MARKER = "--- inplace setup"
+    END_MARKER = "--- inplace end"
+    BASELINE_STAGE = "baseline"
 
-    def __init__(self, setup, config, env, **kwargs):
-        self.setup = setup
+    def __init__(self, setup, config, stage_diffs=False, **kwargs):
+        self.setups = flatten([setup])
         self.config = config
-        self.env_dict = env
+        self.stage_diffs = stage_diffs
         self.consumer = None
         kwargs = self.setupShellMixin(kwargs, prohibitArgs=['command'])
         BuildStep.__init__(self, **kwargs)
@@ -82,20 +193,65 @@ class SetupStep(ShellMixin, BuildStep):
     def run(self):
         worker = self.config.inplace_workers.named_get(self.getWorkerName())
         shell_config = self._shell_config(worker)
+        cache_key = (worker.name, tuple(self.setups))
+        fingerprint = yield self._fingerprint(worker, shell_config)
+        env = self.config.environment_cache.get(cache_key, fingerprint) if fingerprint else None
+        if env is not None:
+            metrics.count('env_cache_hits', labels=dict(worker=worker.name, setup='+'.join(self.setups)))
+            yield self.addCompleteLog("envLog", "Reused environment of %s (%s)" % (', '.join(self.setups), fingerprint))
+            self._merge(env, shell_config)
+            defer.returnValue(SUCCESS)
+
         remote_cmd = self._command(worker, shell_config)
         cmd = yield self.makeRemoteShellCommand(command=remote_cmd, collectStdout=True, stdioLogName="envLog")
-        self.consumer = EnvironmentParser(self.env_dict, shell_config['path_delimiter'])
+        self.consumer = StagedEnvironmentParser(self.STAGE_MARKER, self.END_MARKER, shell_config['path_delimiter'],
+                                                self.config.path_lists)
         self.addLogObserver('envLog', LineConsumerLogObserver(self.consumer.retrieve))
-        yield self.runCommand(cmd)
+        with metrics.timer('env_capture', dict(worker=worker.name, setup='+'.join(self.setups))):
+            yield self.runCommand(cmd)
+        env = self.consumer.env_dict
+        if self.stage_diffs:
+            yield self.addCompleteLog("stages", self.consumer.stage_diffs())
+        if cmd.results() == SUCCESS and fingerprint:
+            self.config.environment_cache.put(cache_key, fingerprint, env)
+        self._merge(env, shell_config)
         yield defer.returnValue(cmd.results())
 
+    def _merge(self, env, shell_config):
+        EnvironmentParser(build_env(self.build), shell_config['path_delimiter'], self.config.path_lists).update(env)
+
+    @defer.inlineCallbacks
+    def _fingerprint(self, worker_info, shell_config):
+        """ Returns a cheap fingerprint of the setup scripts or None """
+        scripts = ' '.join(shell_config['quote'] + script + shell_config['quote']
+                           for script in self._scripts(worker_info, shell_config))
+        command = shell_config['fingerprint'] % scripts
+        cmd = yield self.makeRemoteShellCommand(command=shell_config['start'] + [command],
+                                                collectStdout=True, stdioLogName="fingerprint")
+        yield self.runCommand(cmd)
+        if cmd.didFail():
+            defer.returnValue(None)
+        defer.returnValue(cmd.stdout.strip() or None)
+
     def _shell_config(self, worker_info):
         shell = worker_info.shell
         if shell not in self.SHELL_CONFIG:
             shell = self.FALLBACK_SHELL
         return self.SHELL_CONFIG[shell]
 
+    def _scripts(self, worker_info, shell_config):
+        return [''.join([worker_info.setup_dir, setup, shell_config['suffix']]) for setup in self.setups]
+
     def _command(self, worker_info, shell_config):
-        setup = ''.join([shell_config['prefix'], worker_info.setup_dir, self.setup, shell_config['suffix']])
+        end = shell_config['echo'] + self.END_MARKER
+        commands = [shell_config['echo'] + ' '.join([self.STAGE_MARKER, self.BASELINE_STAGE]),
+                    shell_config['echo_env'], end]
+        scripts = self._scripts(worker_info, shell_config)
+        for index, (setup, script) in enumerate(zip(self.setups, scripts)):
+            commands.append(shell_config['prefix'] + script)
+            if self.stage_diffs or index == len(scripts) - 1:
+                commands.append(shell_config['echo'] + ' '.join([self.STAGE_MARKER, setup]))
+                commands.append(shell_config['echo_env'])
+                commands.append(end)
         shell = shell_config['start']
-        return shell + [shell_config['cmd_delimiter'].join([setup, shell_config['echo_env']])]
+        return shell + [shell_config['cmd_delimiter'].join(commands)]
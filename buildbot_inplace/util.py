@@ -0,0 +1,66 @@
+""" Buildbot inplace config
+(C) Copyright 2015 HicknHack Software GmbH
+
+The original code can be found at:
+https://github.com/hicknhack-software/buildbot-inplace-config
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+from twisted.internet import defer, task
+from buildbot.util.service import BuildbotService
+
+
+def write_atomically(file_path, write):
+    """ Calls write with a temporary file that replaces file_path afterwards,
+        so readers never see a partial file """
+    temp_path = file_path + ".tmp"
+    with open(temp_path, 'w') as f:
+        write(f)
+    if os.name == 'nt' and os.path.exists(file_path):
+        os.remove(file_path)  # rename does not replace files on Windows
+    os.rename(temp_path, file_path)
+
+
+class LoopingService(BuildbotService):
+    """ Calls tick every interval seconds while the master runs.
+        reconfigService of a subclass sets interval and calls restart. """
+
+    interval = None
+    _loop = None
+
+    def tick(self):
+        raise NotImplementedError
+
+    @defer.inlineCallbacks
+    def startService(self):
+        yield BuildbotService.startService(self)
+        self._start()
+
+    def stopService(self):
+        self._stop()
+        return BuildbotService.stopService(self)
+
+    def restart(self):
+        if self.running:
+            self._start()
+
+    def _start(self):
+        self._stop()
+        self._loop = task.LoopingCall(self.tick)
+        self._loop.start(self.interval, now=False)
+
+    def _stop(self):
+        if self._loop is not None and self._loop.running:
+            self._loop.stop()
+        self._loop = None
@@ -0,0 +1,44 @@
+""" Buildbot inplace config
+(C) Copyright 2015 HicknHack Software GmbH
+
+The original code can be found at:
+https://github.com/hicknhack-software/buildbot-inplace-config
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from twisted.internet import defer
+from twisted.python import log
+from util import LoopingService
+
+
+class DirectoryWatcher(LoopingService):
+    """ Polls the worker and project directories of the config.
+        Changed files are applied as a delta through the reconfig queue, master.cfg is not read again. """
+
+    name = "InplaceDirectoryWatcher"
+
+    def checkConfig(self, config, interval=10):
+        if interval <= 0:
+            raise ValueError("interval has to be positive")
+
+    def reconfigService(self, config, interval=10):
+        self.config = config
+        self.interval = interval
+        self.restart()
+
+    @defer.inlineCallbacks
+    def tick(self):
+        try:
+            yield self.config.reconfig_queue.update(self.master, self.config.update_from_directories)
+        except Exception:
+            log.err(None, "while applying changed worker and project files")
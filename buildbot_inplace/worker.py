@@ -16,11 +16,10 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from glob import glob
-from os import path
 from twisted.python import log
-from yaml import safe_load
+from yaml_loader import yaml_cache
 from buildbot.worker import Worker as BuildbotWorker
+from model import Frozen, required, tags
 from pprint import pformat
 
 
@@ -31,52 +30,75 @@ def _normalize_path(p):
     return s
 
 
-class Worker(dict):
-    @property
-    def name(self):
-        return self['name']
-
-    @property
-    def password(self):
-        return self['password']
-
-    @property
-    def shell(self):
-        return self['shell']
-
-    @property
-    def setup_dir(self):
-        return _normalize_path(self['setupDir'])
-
-    @property
-    def platforms(self):
-        return self['platforms']
-
-    @property
-    def setups(self):
-        return self['setups']
+class Worker(Frozen):
+    __slots__ = ('name', 'password', 'shell', 'setup_dir', 'reference_dir', 'platforms', 'setups',
+                 'cores', 'memory', 'max_builds')
+
+    def __init__(self, **data):
+        kind = "Worker '%s'" % required(data, 'name', "Worker")
+        capacity = data.get('capacity') or {}
+        reference_dir = data.get('referenceDir')
+        self._init(name=data['name'],
+                   password=required(data, 'password', kind),
+                   shell=required(data, 'shell', kind),
+                   setup_dir=_normalize_path(required(data, 'setupDir', kind)),
+                   reference_dir=_normalize_path(reference_dir) if reference_dir else None,
+                   platforms=frozenset(tags(required(data, 'platforms', kind))),
+                   setups=frozenset(tags(required(data, 'setups', kind))),
+                   cores=capacity.get('cores'),
+                   memory=capacity.get('memory'),
+                   max_builds=capacity.get('maxBuilds'))
 
     def build_worker(self):
-        return BuildbotWorker(self.name, self.password)
+        return BuildbotWorker(self.name, self.password, max_builds=self.max_builds)
 
     @staticmethod
-    def load(workers_dir, inplace_workers, workers):
-        files = glob(path.join(workers_dir, '*.yml'))
+    def load(workers_dir, inplace_workers, workers, processes=0):
+        files = yaml_cache.load(workers_dir, processes)
         if not files:
             raise Exception("No workers found in '%s'!" % workers_dir)
 
         workers.clear()
         inplace_workers.clear()
-        for f in files:
-            s = open(f, 'r')
-            worker_dict = safe_load(s)
-            s.close()
+        for _, worker_dict in files:
             if not isinstance(worker_dict, dict):
                 continue
 
             inplace_worker = Worker(**worker_dict)
             inplace_workers.named_set(inplace_worker)
             log.msg("Registered Worker '%s' on %s with setups %s" %
-                    (inplace_worker.name, pformat(inplace_worker.platforms), pformat(inplace_worker.setups)),
+                    (inplace_worker.name, pformat(sorted(inplace_worker.platforms)),
+                     pformat(sorted(inplace_worker.setups))),
                     system='Inplace Config')
             workers.named_set(inplace_worker.build_worker())
+        return files
+
+
+class WorkerIndex(object):
+    """ Inverted index from platform and setup tags to worker names.
+        Matches are memoized until the index is rebuilt. """
+
+    def __init__(self):
+        self.rebuild([])
+
+    def rebuild(self, workers):
+        self._order = {}
+        self._by_platform = {}
+        self._by_setup = {}
+        self._matches = {}
+        for order, worker in enumerate(workers):
+            self._order[worker.name] = order
+            for platform in worker.platforms:
+                self._by_platform.setdefault(platform, set()).add(worker.name)
+            for setup in worker.setups:
+                self._by_setup.setdefault(setup, set()).add(worker.name)
+
+    def match(self, platform, setups):
+        """ Returns the names of all workers with platform and all setups in load order """
+        key = (platform, frozenset(setups))
+        if key not in self._matches:
+            candidates = [self._by_platform.get(platform, set())]
+            candidates.extend(self._by_setup.get(setup, set()) for setup in key[1])
+            names = set.intersection(*candidates)
+            self._matches[key] = sorted(names, key=self._order.get)
+        return list(self._matches[key])
@@ -0,0 +1,85 @@
+""" Buildbot inplace config
+(C) Copyright 2015 HicknHack Software GmbH
+
+The original code can be found at:
+https://github.com/hicknhack-software/buildbot-inplace-config
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+from glob import glob
+from os import path
+from multiprocessing import Pool
+from yaml import load
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+def load_yaml(stream):
+    """ safe_load with the libyaml parser if available """
+    return load(stream, Loader=SafeLoader)
+
+
+def load_yaml_file(file_path):
+    with open(file_path, 'r') as s:
+        return load_yaml(s)
+
+
+class YamlDirectoryCache(object):
+    """ Parsed YAML files keyed by path. Files are only parsed again if their mtime or size changed. """
+
+    def __init__(self):
+        self._entries = {}  # path -> ((mtime, size), parsed)
+        self.last_parsed = 0  # number of files parsed by the last load
+
+    def load(self, directory, processes=0):
+        """ Returns (path, parsed) for all *.yml files in directory.
+            With processes > 0 changed files are parsed in a process pool. """
+        files = sorted(glob(path.join(directory, '*.yml')))
+        changed = []
+        for file_path in files:
+            stat = os.stat(file_path)
+            key = (stat.st_mtime, stat.st_size)
+            entry = self._entries.get(file_path)
+            if entry is None or entry[0] != key:
+                changed.append((file_path, key))
+
+        changed_paths = [file_path for file_path, _ in changed]
+        if processes and len(changed_paths) > processes:
+            pool = Pool(processes)
+            try:
+                parsed = pool.map(load_yaml_file, changed_paths, chunksize=64)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            parsed = [load_yaml_file(file_path) for file_path in changed_paths]
+        self.last_parsed = len(changed_paths)
+        for (file_path, key), data in zip(changed, parsed):
+            self._entries[file_path] = (key, data)
+
+        self._forget_missing(directory, files)
+        return [(file_path, self._entries[file_path][1]) for file_path in files]
+
+    def _forget_missing(self, directory, files):
+        existing = set(files)
+        prefix = path.join(directory, '')
+        for file_path in list(self._entries):
+            if file_path.startswith(prefix) and file_path not in existing:
+                del self._entries[file_path]
+
+
+# kept at module level, the modules are not reloaded with master.cfg
+yaml_cache = YamlDirectoryCache()